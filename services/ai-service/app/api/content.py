@@ -3,6 +3,7 @@ from pydantic import BaseModel
 from typing import Dict, Any, List, Optional
 from app.services.content_generator import content_generator
 from app.core.gemini_client import get_gemini_client
+from app.core.streaming import ndjson_response
 from app.core.logging import get_logger
 
 router = APIRouter()
@@ -39,6 +40,11 @@ class GenerateCaptionResponse(BaseModel):
 async def generate_theory(req: TheoryRequest):
     return await content_generator.generate_theory(req.topicName, req.masteryLevel)
 
+@router.post("/generate-theory/stream")
+async def generate_theory_stream(req: TheoryRequest):
+    """Stream theory generation as NDJSON delta events followed by a done event"""
+    return ndjson_response(content_generator.stream_theory(req.topicName, req.masteryLevel))
+
 @router.post("/generate-quiz")
 async def generate_quiz(req: QuizRequest):
     return await content_generator.generate_quiz(req.topicName, req.difficulty)
@@ -69,7 +75,7 @@ Return JSON format:
 }}
 """
         
-        result = await gemini.generate_json(prompt)
+        result = await gemini.generate_json(prompt, cache="categorize")
         
         return CategorizeResponse(
             category=result.get('category', 'General'),
@@ -101,7 +107,8 @@ Context: {request.context}
 Make it humble-brag, encouraging, not arrogant. Include emojis.
 Return only the caption text, no JSON."""
         
-        caption = await gemini.generate(prompt)
+        # Captions should vary between calls, so never serve them from cache
+        caption = await gemini.generate(prompt, cache=None)
         
         return GenerateCaptionResponse(caption=caption.strip())
     except Exception as e:
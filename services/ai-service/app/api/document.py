@@ -1,17 +1,24 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from app.services.document_processor import document_processor
+from app.core.config import get_settings
+from app.core.uploads import spool_upload
 from app.core.logging import get_logger
+import os
 
 router = APIRouter()
 logger = get_logger(__name__)
+settings = get_settings()
 
 class ProcessDocumentResponse(BaseModel):
     structure: dict
     topics: List[dict]
     flashcards: List[dict]
     analytics: dict
+    documentId: Optional[str] = None
+    cached: bool = False
+    timings: Dict[str, float] = {}
 
 class GenerateFlashcardsRequest(BaseModel):
     content: str
@@ -22,25 +29,47 @@ class GenerateFlashcardsResponse(BaseModel):
     flashcards: List[dict]
 
 @router.post("/process", response_model=ProcessDocumentResponse)
-async def process_document(file: UploadFile = File(...)):
-    """Process uploaded document and extract structure, topics, and flashcards"""
+async def process_document(
+    file: UploadFile = File(...),
+    userId: Optional[str] = Form(None),
+    topicId: Optional[str] = Form(None)
+):
+    """
+    Process uploaded document and extract structure, topics, and flashcards.
+    With userId and topicId the document is also indexed for RAG.
+    """
+    path = None
     try:
-        # Read file content
-        content = await file.read()
+        # Spool to disk in chunks rather than holding the upload in memory
+        path, content_hash = await spool_upload(
+            file,
+            settings.MAX_UPLOAD_BYTES,
+            chunk_size=settings.UPLOAD_CHUNK_BYTES,
+            directory=settings.UPLOAD_TMP_DIR
+        )
         
         # Determine file type
         file_type = 'pdf' if file.filename.endswith('.pdf') else 'txt'
         
         # Process document
         result = await document_processor.process_document(
-            file_content=content,
-            file_type=file_type
+            file_path=path,
+            file_type=file_type,
+            user_id=userId,
+            topic_id=topicId,
+            metadata={"filename": file.filename},
+            content_hash=content_hash
         )
         
         return ProcessDocumentResponse(**result)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Document processing failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if path is not None:
+            os.unlink(path)
 
 @router.post("/generate-flashcards", response_model=GenerateFlashcardsResponse)
 async def generate_flashcards(request: GenerateFlashcardsRequest):
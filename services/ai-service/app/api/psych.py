@@ -1,10 +1,15 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
-from ml_models.psych_state import PsychStateAnalyzer
+from app.core.models import model_registry
 
 router = APIRouter()
-analyzer = PsychStateAnalyzer()
+
+def _build_analyzer():
+    from ml_models.psych_state import PsychStateAnalyzer
+    return PsychStateAnalyzer()
+
+model_registry.register("psych_state", _build_analyzer)
 
 class ActivityLog(BaseModel):
     type: str # APP_SWITCH, USAGE, NOTIFICATION
@@ -25,6 +30,7 @@ class AnalysisResponse(BaseModel):
 @router.post("/analyze-state", response_model=AnalysisResponse)
 async def analyze_psychological_state(request: AnalysisRequest):
     try:
+        analyzer = await model_registry.aget("psych_state")
         result = analyzer.analyze(request.activities)
         return {
             "userId": request.userId,
@@ -2,6 +2,7 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional
 from app.services.rag_engine import rag_engine
+from app.core.streaming import ndjson_response
 from app.core.logging import get_logger
 
 router = APIRouter()
@@ -23,6 +24,17 @@ class QueryResponse(BaseModel):
     sources: List[Source]
     confidence: float
 
+class AnswerRequest(BaseModel):
+    query: str
+    context_chunks: List[str]
+    include_follow_up: bool = True
+
+class AnswerResponse(BaseModel):
+    answer: str
+    related_topics: List[str]
+    suggested_questions: List[str]
+    sources_used: int = 0
+
 class AddDocumentRequest(BaseModel):
     userId: str
     topicId: str
@@ -62,6 +74,39 @@ async def query_knowledge(request: QueryRequest):
         logger.error(f"RAG query failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/query/stream")
+async def query_knowledge_stream(request: QueryRequest):
+    """Stream a RAG answer as NDJSON: sources first, then answer deltas, then done"""
+    return ndjson_response(rag_engine.query_stream(
+        query=request.query,
+        user_id=request.userId,
+        topic_id=request.topicId,
+        max_results=request.maxResults
+    ))
+
+@router.post("/rag/answer", response_model=AnswerResponse)
+async def answer_from_context(request: AnswerRequest):
+    """Answer a query from caller-supplied context chunks (e.g. learning-service deep dives)"""
+    try:
+        return await rag_engine.answer_query(
+            query=request.query,
+            context_chunks=request.context_chunks,
+            include_follow_up=request.include_follow_up
+        )
+    
+    except Exception as e:
+        logger.error(f"RAG answer failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/rag/answer/stream")
+async def answer_from_context_stream(request: AnswerRequest):
+    """Stream an answer as NDJSON: answer deltas, the answer with related topics, follow-ups, then done"""
+    return ndjson_response(rag_engine.answer_query_stream(
+        query=request.query,
+        context_chunks=request.context_chunks,
+        include_follow_up=request.include_follow_up
+    ))
+
 @router.post("/add-document", response_model=AddDocumentResponse)
 async def add_document(request: AddDocumentRequest):
     """Add a document to the RAG knowledge base"""
@@ -1,7 +1,11 @@
+import json
+from aiokafka import AIOKafkaConsumer
+from app.core.config import get_settings
 from app.core.logging import get_logger
-from app.core.kafka import kafka_consumer
+from app.core.gemini_client import priority_lane
 
 logger = get_logger(__name__)
+settings = get_settings()
 
 async def handle_content_event(message: dict):
     """Handle content-related events"""
@@ -10,10 +14,12 @@ async def handle_content_event(message: dict):
     
     logger.info(f"Processing content event: {event_type}")
     
-    if event_type == 'DOCUMENT_UPLOADED':
-        await handle_document_upload(data)
-    elif event_type == 'CONTENT_CAPTURED':
-        await handle_content_capture(data)
+    # Event-driven work yields to interactive requests for Gemini capacity
+    with priority_lane("background"):
+        if event_type == 'DOCUMENT_UPLOADED':
+            await handle_document_upload(data)
+        elif event_type == 'CONTENT_CAPTURED':
+            await handle_content_capture(data)
 
 async def handle_document_upload(data: dict):
     """Process uploaded document"""
@@ -51,10 +57,23 @@ async def handle_content_capture(data: dict):
         logger.error(f"Failed to process capture {capture_id}: {str(e)}")
 
 async def start_event_consumer():
-    """Start consuming events from Kafka"""
-    logger.info("Starting AI service event consumer")
-    
-    # Subscribe to content events
-    await kafka_consumer.subscribe('ai-service-content', 'content-events', handle_content_event)
+    """Consume content events from Kafka until cancelled"""
+    consumer = AIOKafkaConsumer(
+        'content-events',
+        bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
+        group_id="ai-service-content",
+        value_deserializer=lambda x: json.loads(x.decode('utf-8'))
+    )
     
+    await consumer.start()
     logger.info("AI service event consumer started")
+    try:
+        async for message in consumer:
+            if not isinstance(message.value, dict):
+                continue
+            try:
+                await handle_content_event(message.value)
+            except Exception as e:
+                logger.error(f"Error processing content event: {e}")
+    finally:
+        await consumer.stop()
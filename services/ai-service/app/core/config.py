@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional, Dict
 
 class Settings(BaseSettings):
     APP_NAME: str = "Kai AI Service"
@@ -11,6 +12,93 @@ class Settings(BaseSettings):
     
     # Kafka
     KAFKA_BOOTSTRAP_SERVERS: str = "kafka:29092"
+    # Screen-time consumer: records per getmany() batch and max wait
+    KAFKA_BATCH_MAX_RECORDS: int = 500
+    KAFKA_BATCH_TIMEOUT_MS: int = 100
+    # Idle users' screen-time windows expire after this many seconds
+    SCREEN_TIME_WINDOW_TTL: int = 86400
+    # Advance cached per-user LSTM states one step per session instead of
+    # replaying the window; states are rebuilt from the window this often
+    DOOMSCROLL_INCREMENTAL: bool = False
+    DOOMSCROLL_STATE_REFRESH_STEPS: int = 10
+    # Doomscroll LSTM runtime: eager | torchscript | int8; torch intra-op
+    # threads for this process (0 = torch default, usually all cores)
+    DOOMSCROLL_RUNTIME: str = "torchscript"
+    DOOMSCROLL_NUM_THREADS: int = 0
+    
+    # Load ML models in the background at startup (otherwise on first use)
+    MODEL_WARMUP: bool = True
+    
+    # Embedding model and inference backend: "torch", "torch-int8" or "onnx"
+    EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    EMBEDDING_BACKEND: str = "torch"
+    EMBEDDING_ONNX_FILE: Optional[str] = None  # e.g. "onnx/model_qint8_avx512_vnni.onnx"
+    EMBEDDING_MIN_COSINE: float = 0.99  # drift tolerance vs the fp32 baseline
+    
+    # Embedding cache value format: "float32", "float16" or "int8"
+    EMBEDDING_CACHE_ENCODING: str = "float32"
+    EMBEDDING_CACHE_TTL: int = 86400
+    
+    # Embedding micro-batching: flush at this many texts or after this wait
+    EMBEDDING_BATCH_MAX_SIZE: int = 64
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = 5.0
+    
+    # Gemini response cache: TTL (seconds) per cache policy named by callers
+    GEMINI_CACHE_MAX_ENTRIES: int = 1024
+    GEMINI_CACHE_TTLS: Dict[str, int] = {
+        "default": 3600,
+        "theory": 86400,
+        "quiz": 3600,
+        "categorize": 86400,
+        "document": 604800
+    }
+    
+    # Coalesce identical in-flight Gemini calls across replicas via a Redis lock
+    GEMINI_DISTRIBUTED_SINGLE_FLIGHT: bool = True
+    GEMINI_SINGLE_FLIGHT_LOCK_MS: int = 30000
+    
+    # Gemini admission control (per replica)
+    GEMINI_MAX_CONCURRENCY: int = 8
+    GEMINI_REQUESTS_PER_MINUTE: int = 60
+    GEMINI_TOKENS_PER_MINUTE: int = 120000
+    GEMINI_ESTIMATED_OUTPUT_TOKENS: int = 1024
+    
+    # Fail fast to fallbacks during Gemini outages
+    GEMINI_BREAKER_FAILURE_THRESHOLD: int = 5
+    GEMINI_BREAKER_RECOVERY_SECONDS: float = 30.0
+    GEMINI_BREAKER_HALF_OPEN_CALLS: int = 1
+    
+    # Uploads are spooled to disk; larger bodies are rejected with 413
+    MAX_UPLOAD_BYTES: int = 50 * 1024 * 1024
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024
+    UPLOAD_TMP_DIR: Optional[str] = None
+    
+    # Document analysis: token windows, map-reduce fan-out
+    DOCUMENT_CHUNK_TOKENS: int = 3000
+    DOCUMENT_CHUNK_OVERLAP_TOKENS: int = 200
+    DOCUMENT_MAP_CONCURRENCY: int = 4
+    DOCUMENT_MAX_TOPICS: int = 30
+    DOCUMENT_FLASHCARD_CHUNKS: int = 3
+    
+    # Processed-document results by SHA-256 of the upload
+    DOCUMENT_CACHE_TTL: int = 604800
+    
+    # PDF text extraction process pool
+    PDF_EXTRACT_WORKERS: int = 2
+    PDF_PAGES_PER_TASK: int = 50
+    PDF_EXTRACT_TIMEOUT_SECONDS: float = 120.0
+    
+    # RAG vector index ("exact", "ivf" or "mmap")
+    RAG_INDEX_BACKEND: str = "exact"
+    RAG_INDEX_PATH: str = "./data/rag-index"  # segment files for the mmap backend
+    RAG_IVF_NLIST: Optional[int] = None  # None = 4 * sqrt(partition size)
+    RAG_IVF_NPROBE: int = 16
+    RAG_IVF_MIN_TRAIN_SIZE: int = 20000
+    
+    # Retrieval: "dense" or "hybrid" (BM25 + embeddings, reciprocal rank fusion)
+    RAG_RETRIEVAL_MODE: str = "hybrid"
+    RAG_HYBRID_CANDIDATES: int = 200
+    RAG_LEXICAL_PREFILTER_MIN_SIZE: int = 5000
     
     class Config:
         env_file = ".env"
@@ -1,50 +1,795 @@
 import google.generativeai as genai
-from tenacity import retry, stop_after_attempt, wait_exponential
-from typing import Optional, Dict, Any
+from google.api_core import exceptions as api_exceptions
+from redis.exceptions import RedisError
+from tenacity import retry, retry_if_not_exception_type, stop_after_attempt, wait_exponential
+from typing import Optional, Dict, Any, AsyncIterator, Callable, List, Tuple
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
 import os
+import time
+import uuid
+from app.core.config import get_settings
+from app.core.redis_client import redis_client
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
+settings = get_settings()
+
+JSON_INSTRUCTION = "\n\nIMPORTANT: Return ONLY valid JSON, no markdown formatting."
+
+def parse_json_text(text: str) -> Any:
+    """Parse a JSON reply, tolerating markdown code fences around it"""
+    text = text.strip()
+    if text.startswith('```json'):
+        text = text[7:]  # Remove ```json
+    if text.startswith('```'):
+        text = text[3:]  # Remove ```
+    if text.endswith('```'):
+        text = text[:-3]  # Remove trailing ```
+    return json.loads(text.strip())
+
+def expect_type(*types: type) -> Callable[[Any], None]:
+    """validate= hook for generate_json(): reject replies that are not one of `types`"""
+    def check(value: Any):
+        if not isinstance(value, types):
+            names = " or ".join(t.__name__ for t in types)
+            raise ValueError(f"Expected {names}, got {type(value).__name__}")
+    return check
+
+class ResponseCache:
+    """
+    Two-tier content-addressed cache for Gemini responses.
+
+    Keys are a SHA-256 of model + response kind + prompt + generation
+    kwargs. An in-process LRU sits in front of Redis; both tiers honour the
+    TTL of the cache policy the caller names (see GEMINI_CACHE_TTLS).
+    """
+
+    def __init__(self, max_entries: int = 1024, ttls: Optional[Dict[str, int]] = None):
+        self.max_entries = max_entries
+        self.ttls = ttls or {"default": 3600}
+        # key -> (expires_at, serialised value); values are stored as JSON so
+        # callers can never mutate a shared cached object
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def ttl(self, policy: str) -> int:
+        return self.ttls.get(policy, self.ttls.get("default", 3600))
+
+    def make_key(self, model: str, kind: str, prompt: str, kwargs: Dict[str, Any]) -> str:
+        material = json.dumps(
+            {"model": model, "kind": kind, "prompt": prompt, "kwargs": kwargs},
+            sort_keys=True,
+            default=str
+        )
+        return f"gemini:response:{hashlib.sha256(material.encode('utf-8')).hexdigest()}"
+
+    def _count(self, policy: str, outcome: str):
+        counters = self.stats.setdefault(policy, {"memory_hits": 0, "redis_hits": 0, "misses": 0})
+        counters[outcome] += 1
+
+    async def get(self, key: str, policy: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._count(policy, "memory_hits")
+                return json.loads(entry[1])
+            del self._entries[key]
+
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.ttl(key)
+                cached, remaining = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Gemini cache read failed: {str(e)}")
+            cached, remaining = None, None
+
+        if cached is None:
+            self._count(policy, "misses")
+            return None
+
+        # Keep the local copy no longer than Redis would
+        self._remember(key, cached, remaining if remaining and remaining > 0 else self.ttl(policy))
+        self._count(policy, "redis_hits")
+        return json.loads(cached)
+
+    async def set(self, key: str, value: Any, policy: str):
+        ttl = self.ttl(policy)
+        serialised = json.dumps(value)
+        self._remember(key, serialised, ttl)
+        try:
+            await redis_client.setex(key, ttl, serialised)
+        except Exception as e:
+            logger.warning(f"Gemini cache write failed: {str(e)}")
+
+    def _remember(self, key: str, value: str, ttl: int):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical requests into one upstream call.
+
+    Within a process, callers with the same key await one shared task and
+    all receive its result or its exception. With `distributed=True` a
+    Redis lock elects one leader across replicas; the others subscribe to
+    a completion channel and then read the leader's result from the cache.
+    """
+
+    RELEASE_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, distributed: bool = True, lock_ttl_ms: int = 30000):
+        self.distributed = distributed
+        self.lock_ttl_ms = lock_ttl_ms
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"leaders": 0, "coalesced": 0, "remote_followers": 0}
+
+    async def run(self, key: str, compute, read_cached) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run_distributed(key, compute, read_cached))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self.stats["leaders"] += 1
+        else:
+            self.stats["coalesced"] += 1
+        # Shielded so one caller's cancellation does not cancel the others
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every caller went away
+
+    async def _run_distributed(self, key: str, compute, read_cached) -> Any:
+        if not self.distributed:
+            return await compute()
+
+        lock_key, channel, token = f"{key}:lock", f"{key}:done", uuid.uuid4().hex
+        try:
+            acquired = await redis_client.set(lock_key, token, nx=True, px=self.lock_ttl_ms)
+        except Exception as e:
+            logger.warning(f"Single-flight lock unavailable: {str(e)}")
+            return await compute()
+
+        if acquired:
+            try:
+                result = await compute()
+                await self._publish(channel, {"ok": True})
+                return result
+            except Exception as e:
+                await self._publish(channel, {"ok": False, "error": str(e)})
+                raise
+            finally:
+                try:
+                    await redis_client.eval(self.RELEASE_SCRIPT, 1, lock_key, token)
+                except Exception as e:
+                    logger.warning(f"Single-flight lock release failed: {str(e)}")
+
+        self.stats["remote_followers"] += 1
+        value = await self._wait_for_leader(lock_key, channel, read_cached)
+        if value is not None:
+            return value
+        # Leader timed out or finished without a cacheable result
+        return await compute()
+
+    async def _publish(self, channel: str, message: Dict[str, Any]):
+        try:
+            await redis_client.publish(channel, json.dumps(message))
+        except Exception as e:
+            logger.warning(f"Single-flight publish failed: {str(e)}")
+
+    async def _wait_for_leader(self, lock_key: str, channel: str, read_cached) -> Optional[Any]:
+        pubsub = redis_client.pubsub()
+        try:
+            # Subscribe before re-checking so a completion cannot slip in between
+            await pubsub.subscribe(channel)
+            value = await read_cached()
+            if value is not None or not await redis_client.exists(lock_key):
+                return value
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.lock_ttl_ms / 1000
+            while (remaining := deadline - loop.time()) > 0:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+                if message is None:
+                    continue
+                payload = json.loads(message["data"])
+                if not payload.get("ok"):
+                    raise Exception(payload.get("error", "Gemini request failed on another replica"))
+                return await read_cached()
+            return None
+        except Exception as e:
+            # redis-py's ConnectionError/TimeoutError are not the builtins
+            if isinstance(e, (RedisError, ConnectionError, TimeoutError)):
+                logger.warning(f"Single-flight wait failed: {str(e)}")
+                return None
+            raise
+        finally:
+            try:
+                await pubsub.unsubscribe(channel)
+                await pubsub.close()
+            except Exception:
+                pass
+
+# Interactive endpoints are admitted ahead of background work
+LANES = ("interactive", "background")
+
+_current_lane: ContextVar[str] = ContextVar("gemini_priority_lane", default="interactive")
+
+@contextmanager
+def priority_lane(lane: str):
+    """Run Gemini calls made inside the block in the given lane"""
+    if lane not in LANES:
+        raise ValueError(f"Unknown priority lane: {lane}")
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+class TokenBucket:
+    """Continuously refilling bucket of `per_minute` units"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(max(1, per_minute))
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if now)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, delta: float):
+        """Charge (or refund, if negative) the difference from an estimate"""
+        self._refill()
+        self.level = min(self.capacity, self.level - delta)
+
+class RateLimiter:
+    """
+    Admission control for upstream Gemini calls.
+
+    A call is admitted when a concurrency slot is free and both the
+    requests/min and tokens/min buckets can cover it. Waiters are served
+    strictly by lane, then arrival order, so queued background work never
+    holds up an interactive request. Token costs are estimated up front
+    and corrected with the reported usage once the response arrives.
+    """
+
+    def __init__(self, max_concurrency: int, requests_per_minute: int, tokens_per_minute: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future, int]] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._stats = {lane: {"admitted": 0, "queued": 0, "wait_seconds": 0.0} for lane in LANES}
+
+    def _admissible(self, cost: int) -> float:
+        return max(self.requests.wait_time(1), self.tokens.wait_time(cost))
+
+    def _admit(self, cost: int):
+        self.requests.take(1)
+        self.tokens.take(cost)
+        self._active += 1
+
+    async def acquire(self, lane: str, cost: int):
+        stats = self._stats[lane]
+        if not self._waiters and self._active < self.max_concurrency and self._admissible(cost) == 0:
+            self._admit(cost)
+            stats["admitted"] += 1
+            return
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (LANES.index(lane), next(self._seq), future, cost))
+        stats["queued"] += 1
+        self._dispatch()
+        start = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as we were cancelled: hand the slot back
+                self.release(0)
+            raise
+        stats["admitted"] += 1
+        stats["wait_seconds"] += time.monotonic() - start
+
+    def release(self, token_correction: int):
+        self._active -= 1
+        if token_correction:
+            self.tokens.adjust(token_correction)
+        self._dispatch()
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._waiters:
+            _, _, future, cost = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self._active >= self.max_concurrency:
+                return
+            delay = self._admissible(cost)
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self._admit(cost)
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, lane: str, estimated_tokens: int):
+        """Hold an admission for one call; set usage["tokens"] to the actual cost"""
+        await self.acquire(lane, estimated_tokens)
+        usage = {"tokens": estimated_tokens}
+        try:
+            yield usage
+        finally:
+            self.release(usage["tokens"] - estimated_tokens)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        queued = {lane: 0 for lane in LANES}
+        for priority, _, future, _ in self._waiters:
+            if not future.done():
+                queued[LANES[priority]] += 1
+        return {
+            "active": self._active,
+            "waiting": queued,
+            "requests_available": round(self.requests.level, 1),
+            "tokens_available": round(self.tokens.level),
+            "lanes": self._stats
+        }
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Gemini while the circuit breaker is open"""
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker around upstream calls.
+
+    After `failure_threshold` consecutive upstream failures the breaker
+    opens and calls fail immediately with CircuitOpenError, so callers drop
+    straight to their fallbacks. After `recovery_seconds` it lets
+    `half_open_calls` probes through: a success closes it, a failure opens
+    it again. Use `call()` around each upstream call so every probe is
+    settled, whichever way the call ends.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_seconds: float = 30.0, half_open_calls: int = 1):
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_seconds = recovery_seconds
+        self.half_open_calls = max(1, half_open_calls)
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._counts = {"trips": 0, "rejected": 0, "failures": 0}
+
+    @contextmanager
+    def call(self):
+        """
+        Guard one upstream call: admit it (or raise CircuitOpenError), then
+        record how it ended. Any reply, including an error that is not an
+        outage (e.g. a 400), shows upstream is up; a call abandoned without
+        a reply (cancelled) just frees its probe slot.
+        """
+        probe = self.before_call()
+        try:
+            yield
+        except Exception as e:
+            if self.is_outage(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        except BaseException:
+            self.release_probe(probe)
+            raise
+        else:
+            self.record_success()
+
+    def before_call(self) -> bool:
+        """Admit a call or raise CircuitOpenError; True if it is a half-open probe"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.recovery_seconds:
+                self._reject()
+            self._transition(self.HALF_OPEN)
+            self._probes = 0
+
+        if self.state == self.HALF_OPEN:
+            if self._probes >= self.half_open_calls:
+                self._reject()
+            self._probes += 1
+            return True
+        return False
+
+    def release_probe(self, probe: bool):
+        """Give back the slot of a probe that ended without an answer"""
+        if probe and self.state == self.HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+
+    def record_success(self):
+        self._failures = 0
+        if self.state != self.CLOSED:
+            self._transition(self.CLOSED)
+
+    def record_failure(self):
+        self._counts["failures"] += 1
+        self._failures += 1
+        if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            self._trip()
+
+    def _reject(self):
+        self._counts["rejected"] += 1
+        raise CircuitOpenError("Gemini circuit breaker is open")
+
+    def _trip(self):
+        self._counts["trips"] += 1
+        self._opened_at = time.monotonic()
+        self._transition(self.OPEN)
+
+    def _transition(self, state: str):
+        if state != self.state:
+            logger.warning(f"Gemini circuit breaker {self.state} -> {state}")
+            self.state = state
+
+    @staticmethod
+    def is_outage(error: Exception) -> bool:
+        """Upstream/availability errors count; bad requests do not"""
+        if isinstance(error, api_exceptions.ClientError):
+            return isinstance(error, api_exceptions.TooManyRequests)
+        return True
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        retry_in = 0.0
+        if self.state == self.OPEN:
+            retry_in = max(0.0, self.recovery_seconds - (time.monotonic() - self._opened_at))
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "retry_in_seconds": round(retry_in, 1),
+            **self._counts
+        }
 
 class GeminiClient:
     """Centralized Gemini API client with retry logic and error handling"""
     
     def __init__(self, api_key: Optional[str] = None):
+        self.model_name = 'gemini-pro'
+        self.cache = ResponseCache(settings.GEMINI_CACHE_MAX_ENTRIES, settings.GEMINI_CACHE_TTLS)
+        self.single_flight = SingleFlight(
+            distributed=settings.GEMINI_DISTRIBUTED_SINGLE_FLIGHT,
+            lock_ttl_ms=settings.GEMINI_SINGLE_FLIGHT_LOCK_MS
+        )
+        self.breaker = CircuitBreaker(
+            failure_threshold=settings.GEMINI_BREAKER_FAILURE_THRESHOLD,
+            recovery_seconds=settings.GEMINI_BREAKER_RECOVERY_SECONDS,
+            half_open_calls=settings.GEMINI_BREAKER_HALF_OPEN_CALLS
+        )
+        self.limiter = RateLimiter(
+            max_concurrency=settings.GEMINI_MAX_CONCURRENCY,
+            requests_per_minute=settings.GEMINI_REQUESTS_PER_MINUTE,
+            tokens_per_minute=settings.GEMINI_TOKENS_PER_MINUTE
+        )
         self.api_key = api_key or os.getenv('GEMINI_API_KEY')
         if not self.api_key:
             logger.warning("GEMINI_API_KEY not set, AI features will be limited")
             self.enabled = False
         else:
             genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-pro')
+            self.model = genai.GenerativeModel(self.model_name)
             self.enabled = True
             logger.info("Gemini client initialized successfully")
     
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=1, max=10),
-        reraise=True
-    )
-    async def generate(self, prompt: str, **kwargs) -> str:
+    async def generate(
+        self,
+        prompt: str,
+        cache: Optional[str] = "default",
+        priority: Optional[str] = None,
+        **kwargs
+    ) -> str:
         """
-        Generate content using Gemini with retry logic
+        Generate content using Gemini with response caching and retry logic
         
         Args:
             prompt: The prompt to send to Gemini
+            cache: Cache policy name (TTL from GEMINI_CACHE_TTLS), or None to bypass
+            priority: "interactive" or "background" (defaults to the current priority_lane)
             **kwargs: Additional generation parameters
             
         Returns:
             Generated text response
             
         Raises:
+            CircuitOpenError: If the circuit breaker is open
             Exception: If all retries fail or API key not configured
         """
+        with priority_lane(priority or _current_lane.get()):
+            return await self._cached("text", prompt, cache, kwargs, self._generate)
+    
+    async def generate_json(
+        self,
+        prompt: str,
+        cache: Optional[str] = "default",
+        priority: Optional[str] = None,
+        validate: Optional[Callable[[Any], Any]] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Generate JSON content using Gemini
+        
+        Args:
+            prompt: The prompt to send to Gemini (should request JSON output)
+            cache: Cache policy name (TTL from GEMINI_CACHE_TTLS), or None to bypass
+            priority: "interactive" or "background" (defaults to the current priority_lane)
+            validate: Called with the parsed reply before caching it; if it
+                raises, the reply is returned but not cached (e.g. expect_type(list))
+            **kwargs: Additional generation parameters
+            
+        Returns:
+            Parsed JSON response
+        """
+        with priority_lane(priority or _current_lane.get()):
+            return await self._cached("json", prompt, cache, kwargs, self._generate_json, validate)
+    
+    async def generate_stream(
+        self,
+        prompt: str,
+        cache: Optional[str] = "default",
+        priority: Optional[str] = None,
+        validate: Optional[Callable[[str], Any]] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Stream generated text as Gemini produces it
+        
+        Shares cache entries with generate(): a hit is yielded as a single
+        chunk, and a completed stream is cached. Identical concurrent
+        streams share one upstream call; the others get its full text as a
+        single chunk once it is done. Streams are not retried, since
+        partial output may already have reached the client.
+        
+        Args:
+            prompt: The prompt to send to Gemini
+            cache: Cache policy name (TTL from GEMINI_CACHE_TTLS), or None to bypass
+            priority: "interactive" or "background" (defaults to the current priority_lane)
+            validate: Called with the full text before caching it; if it
+                raises, the reply is not cached
+            **kwargs: Additional generation parameters
+            
+        Yields:
+            Text chunks in order
+        """
+        async for text in self._stream("text", prompt, prompt, cache, priority, kwargs, lambda text: text, validate):
+            yield text
+    
+    async def generate_json_stream(
+        self,
+        prompt: str,
+        cache: Optional[str] = "default",
+        priority: Optional[str] = None,
+        validate: Optional[Callable[[Any], Any]] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Stream the raw text of a JSON reply as Gemini produces it
+        
+        Shares cache entries with generate_json() for the same prompt: a
+        hit (or a reply another caller is already streaming) is yielded as
+        one chunk of serialised JSON, and a completed stream that parses
+        fills the entry generate_json() reads.
+        
+        Args:
+            prompt: The prompt to send to Gemini (JSON_INSTRUCTION is appended)
+            cache: Cache policy name (TTL from GEMINI_CACHE_TTLS), or None to bypass
+            priority: "interactive" or "background" (defaults to the current priority_lane)
+            validate: Called with the parsed reply before caching it; if it
+                raises, the reply is not cached
+            **kwargs: Additional generation parameters
+            
+        Yields:
+            Text chunks in order; raises after the last one if the reply is not valid JSON
+        """
+        async for text in self._stream(
+            "json", prompt, prompt + JSON_INSTRUCTION, cache, priority, kwargs, parse_json_text, validate
+        ):
+            yield text
+    
+    async def _stream(
+        self,
+        kind: str,
+        prompt: str,
+        upstream_prompt: str,
+        policy: Optional[str],
+        priority: Optional[str],
+        kwargs: Dict[str, Any],
+        finish: Callable[[str], Any],
+        validate: Optional[Callable[[Any], Any]]
+    ) -> AsyncIterator[str]:
+        if not self.enabled:
+            raise Exception("Gemini API not configured. Set GEMINI_API_KEY environment variable.")
+        
+        lane = priority or _current_lane.get()
+        if policy is None:
+            async for text in self._stream_model(upstream_prompt, lane, kwargs):
+                yield text
+            return
+        
+        key = self.cache.make_key(self.model_name, kind, prompt, kwargs)
+        cached = await self.cache.get(key, policy)
+        if cached is not None:
+            yield cached if kind == "text" else json.dumps(cached)
+            return
+        
+        # Only the caller whose compute() wins the single-flight sees chunks
+        # here; the others receive the finished result
+        chunks: asyncio.Queue = asyncio.Queue()
+        
+        async def compute():
+            parts = []
+            async for text in self._stream_model(upstream_prompt, lane, kwargs):
+                parts.append(text)
+                chunks.put_nowait(text)
+            result = finish("".join(parts))
+            if self._valid(result, validate):
+                await self.cache.set(key, result, policy)
+            return result
+        
+        flight = asyncio.ensure_future(self.single_flight.run(key, compute, lambda: self.cache.get(key, policy)))
+        streamed = False
+        try:
+            while not flight.done() or not chunks.empty():
+                getter = asyncio.ensure_future(chunks.get())
+                await asyncio.wait({getter, flight}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    continue
+                streamed = True
+                yield getter.result()
+            result = flight.result()
+            if not streamed:
+                yield result if kind == "text" else json.dumps(result)
+        finally:
+            # The shared call is shielded: it still finishes (and is cached) for the others
+            flight.cancel()
+    
+    async def _stream_model(self, prompt: str, lane: str, kwargs: Dict[str, Any]) -> AsyncIterator[str]:
+        """One streamed upstream call, gated by the circuit breaker and rate limiter"""
+        estimate = self._estimate_tokens(prompt)
+        started = False
+        with self.breaker.call():
+            async with self.limiter.slot(lane, estimate) as usage:
+                try:
+                    response = await self.model.generate_content_async(prompt, stream=True, **kwargs)
+                    async for chunk in response:
+                        if not started:
+                            # First bytes arrived, so upstream is up even if the client hangs up
+                            self.breaker.record_success()
+                            started = True
+                        yield chunk.text
+                except Exception as e:
+                    logger.error(f"Gemini streaming error: {str(e)}")
+                    raise
+                usage["tokens"] = self._usage_tokens(response, estimate)
+    
+    async def _cached(
+        self,
+        kind: str,
+        prompt: str,
+        policy: Optional[str],
+        kwargs: Dict[str, Any],
+        call,
+        validate: Optional[Callable[[Any], Any]] = None
+    ):
+        if policy is None or not self.enabled:
+            return await call(prompt, **kwargs)
+        
+        key = self.cache.make_key(self.model_name, kind, prompt, kwargs)
+        cached = await self.cache.get(key, policy)
+        if cached is not None:
+            return cached
+        
+        async def compute():
+            result = await call(prompt, **kwargs)
+            if self._valid(result, validate):
+                await self.cache.set(key, result, policy)
+            return result
+        
+        # Identical concurrent misses share one upstream call
+        return await self.single_flight.run(key, compute, lambda: self.cache.get(key, policy))
+    
+    @staticmethod
+    def _valid(result: Any, validate: Optional[Callable[[Any], Any]]) -> bool:
+        """Whether a reply may be cached: validate (if any) must not raise"""
+        if validate is None:
+            return True
+        try:
+            validate(result)
+            return True
+        except Exception as e:
+            logger.warning(f"Not caching reply that failed validation: {str(e)}")
+            return False
+    
+    def stats(self) -> Dict[str, Any]:
+        """Cache, request coalescing, rate limiter and circuit breaker counters"""
+        return {
+            "circuit_breaker": self.breaker.stats,
+            "cache": self.cache.stats,
+            "single_flight": self.single_flight.stats,
+            "rate_limiter": self.limiter.stats
+        }
+    
+    @staticmethod
+    def _estimate_tokens(prompt: str) -> int:
+        # ~4 characters per token, plus the expected completion
+        return len(prompt) // 4 + settings.GEMINI_ESTIMATED_OUTPUT_TOKENS
+    
+    @staticmethod
+    def _usage_tokens(response, estimate: int) -> int:
+        usage = getattr(response, "usage_metadata", None)
+        return getattr(usage, "total_token_count", 0) or estimate
+    
+    async def _call_model(self, prompt: str, **kwargs):
+        """One upstream call, gated by the circuit breaker and rate limiter"""
+        estimate = self._estimate_tokens(prompt)
+        with self.breaker.call():
+            async with self.limiter.slot(_current_lane.get(), estimate) as usage:
+                response = await self.model.generate_content_async(prompt, **kwargs)
+                usage["tokens"] = self._usage_tokens(response, estimate)
+                return response
+    
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=1, max=10),
+        retry=retry_if_not_exception_type(CircuitOpenError),
+        reraise=True
+    )
+    async def _generate(self, prompt: str, **kwargs) -> str:
         if not self.enabled:
             raise Exception("Gemini API not configured. Set GEMINI_API_KEY environment variable.")
         
         try:
-            response = await self.model.generate_content_async(prompt, **kwargs)
+            response = await self._call_model(prompt, **kwargs)
             return response.text
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"Gemini API error: {str(e)}")
             raise
@@ -52,44 +797,23 @@ class GeminiClient:
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=1, max=10),
+        retry=retry_if_not_exception_type(CircuitOpenError),
         reraise=True
     )
-    async def generate_json(self, prompt: str, **kwargs) -> Dict[str, Any]:
-        """
-        Generate JSON content using Gemini
-        
-        Args:
-            prompt: The prompt to send to Gemini (should request JSON output)
-            **kwargs: Additional generation parameters
-            
-        Returns:
-            Parsed JSON response
-        """
-        import json
-        
+    async def _generate_json(self, prompt: str, **kwargs) -> Dict[str, Any]:
         if not self.enabled:
             raise Exception("Gemini API not configured")
         
         try:
             # Add JSON formatting instruction to prompt
-            json_prompt = f"{prompt}\n\nIMPORTANT: Return ONLY valid JSON, no markdown formatting."
-            response = await self.model.generate_content_async(json_prompt, **kwargs)
-            
-            # Clean response text (remove markdown code blocks if present)
-            text = response.text.strip()
-            if text.startswith('```json'):
-                text = text[7:]  # Remove ```json
-            if text.startswith('```'):
-                text = text[3:]  # Remove ```
-            if text.endswith('```'):
-                text = text[:-3]  # Remove trailing ```
-            text = text.strip()
-            
-            return json.loads(text)
+            response = await self._call_model(prompt + JSON_INSTRUCTION, **kwargs)
+            return parse_json_text(response.text)
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse Gemini JSON response: {str(e)}")
             logger.error(f"Response text: {response.text}")
             raise
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"Gemini API error: {str(e)}")
             raise
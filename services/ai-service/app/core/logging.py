@@ -30,3 +30,6 @@ def setup_logging():
     # Set levels for some noisy libraries if needed
     logging.getLogger("uvicorn.access").handlers = []
     logging.getLogger("uvicorn.access").propagate = True
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
@@ -0,0 +1,78 @@
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import threading
+import time
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+class ModelRegistry:
+    """
+    Lazily constructed ML models with load-state tracking.
+
+    Models are registered with a zero-argument factory and built on first
+    `get()` or by `warm_up()` (which loads them in worker threads so the
+    event loop keeps serving). States: not_loaded, loading, ready, failed.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+        self._states[name] = {"state": "not_loaded", "load_seconds": None, "error": None}
+
+    def get(self, name: str) -> Any:
+        """Return the model, building it on first use (thread-safe)"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._locks[name]:
+            instance = self._instances.get(name)
+            if instance is not None:
+                return instance
+
+            self._states[name].update(state="loading", error=None)
+            start = time.perf_counter()
+            try:
+                instance = self._factories[name]()
+            except Exception as e:
+                self._states[name].update(state="failed", error=str(e))
+                logger.error(f"Model {name} failed to load: {str(e)}")
+                raise
+
+            self._instances[name] = instance
+            elapsed = round(time.perf_counter() - start, 3)
+            self._states[name].update(state="ready", load_seconds=elapsed)
+            logger.info(f"Model {name} loaded in {elapsed}s")
+            return instance
+
+    async def aget(self, name: str) -> Any:
+        """Like get(), but builds the model in a worker thread if needed"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        return await asyncio.to_thread(self.get, name)
+
+    async def warm_up(self, names: Optional[List[str]] = None):
+        """Load models one after another in a worker thread"""
+        for name in names or list(self._factories):
+            try:
+                await asyncio.to_thread(self.get, name)
+            except Exception:
+                # Already recorded as failed; keep warming the others
+                pass
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {name: dict(state) for name, state in self._states.items()}
+
+    def is_ready(self) -> bool:
+        return all(state["state"] == "ready" for state in self._states.values())
+
+# Global instance
+model_registry = ModelRegistry()
@@ -9,5 +9,12 @@ redis_client = redis.Redis(
     decode_responses=True
 )
 
+# Raw-bytes connection for binary payloads such as cached embeddings
+redis_binary_client = redis.Redis(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    decode_responses=False
+)
+
 async def get_redis():
     return redis_client
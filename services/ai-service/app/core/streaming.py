@@ -0,0 +1,29 @@
+from typing import Any, AsyncIterator, Dict
+from fastapi.responses import StreamingResponse
+import json
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+def ndjson_response(events: AsyncIterator[Dict[str, Any]]) -> StreamingResponse:
+    """
+    Stream events as newline-delimited JSON, one object per line.
+
+    Headers are already sent when the first event goes out, so a failure
+    mid-stream is reported as a final {"type": "error"} line.
+    """
+
+    async def body():
+        try:
+            async for event in events:
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            logger.error(f"Stream failed: {str(e)}")
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+
+    return StreamingResponse(
+        body(),
+        media_type="application/x-ndjson",
+        # Keep reverse proxies from buffering the whole response
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
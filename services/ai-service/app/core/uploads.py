@@ -0,0 +1,82 @@
+from typing import Optional, Tuple
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+import hashlib
+import os
+import tempfile
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+class MaxBodySizeMiddleware:
+    """
+    Reject request bodies larger than `max_bytes` before they are parsed.
+
+    A declared Content-Length over the limit is answered with 413 without
+    reading the body; chunked bodies are counted as they stream in and
+    fail with 413 as soon as they cross the limit.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        declared = headers.get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > self.max_bytes:
+            response = JSONResponse(
+                {"detail": f"Request body exceeds {self.max_bytes} bytes"},
+                status_code=413
+            )
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail=f"Request body exceeds {self.max_bytes} bytes")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+async def spool_upload(
+    file: UploadFile,
+    max_bytes: int,
+    chunk_size: int = 1024 * 1024,
+    directory: Optional[str] = None
+) -> Tuple[str, str]:
+    """
+    Copy an upload to a named temp file chunk by chunk, hashing as it goes
+
+    Returns:
+        Path of the temp file (the caller deletes it) and its SHA-256
+
+    Raises:
+        HTTPException: 413 if the upload is larger than max_bytes
+    """
+    suffix = os.path.splitext(file.filename or "")[1]
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix="upload-", dir=directory)
+    size = 0
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := await file.read(chunk_size):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"Upload exceeds {max_bytes} bytes")
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+
+    logger.info(f"Spooled upload {file.filename} ({size} bytes)")
+    return path, digest.hexdigest()
@@ -1,28 +1,52 @@
-```python
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 import asyncio
 from app.core.kafka import get_kafka_producer, close_kafka_producer
-from app.core.redis_client import redis_client
-from app.core.logging import setup_logging
+from app.core.redis_client import redis_client, redis_binary_client
+from app.core.logging import setup_logging, get_logger
+from app.core.config import get_settings
+from app.core.models import model_registry
+from app.core.uploads import MaxBodySizeMiddleware
 from app.services.consumer import start_consumer
+from app.consumers.content_consumer import start_event_consumer
+from app.services.pdf_extraction import pdf_extractor
 from app.api import psych, curriculum, content, document, rag, retention
 
+logger = get_logger(__name__)
+settings = get_settings()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     setup_logging()
     await get_kafka_producer()
     
-    # Start Kafka Consumer in background
-    asyncio.create_task(start_consumer())
+    # Start Kafka consumers in background
+    consumers = [
+        asyncio.create_task(start_consumer()),
+        asyncio.create_task(start_event_consumer())
+    ]
+    logger.info("AI Service started successfully")
+    
+    # Load models in the background so the server accepts traffic immediately;
+    # /ready reports 503 until they are all loaded
+    if settings.MODEL_WARMUP:
+        asyncio.create_task(model_registry.warm_up())
     
     yield
     # Shutdown
+    for task in consumers:
+        task.cancel()
+    await asyncio.gather(*consumers, return_exceptions=True)
     await close_kafka_producer()
     await redis_client.close()
+    await redis_binary_client.close()
+    pdf_extractor.shutdown()
 
 app = FastAPI(title="Kai AI Service", lifespan=lifespan)
+# Slack for multipart framing around the file itself
+app.add_middleware(MaxBodySizeMiddleware, max_bytes=settings.MAX_UPLOAD_BYTES + 64 * 1024)
 app.include_router(psych.router, prefix="/api/v1/psych", tags=["Psych Analysis"])
 app.include_router(curriculum.router, prefix="/api/v1/curriculum", tags=["Curriculum"])
 app.include_router(content.router, prefix="/api/v1", tags=["content"])
@@ -30,17 +54,19 @@ app.include_router(document.router, prefix="/api/v1", tags=["document"])
 app.include_router(rag.router, prefix="/api/v1", tags=["rag"])
 app.include_router(retention.router, prefix="/api/v1", tags=["retention"])
 
-@app.on_event("startup")
-async def startup_event():
-    logger.info("AI Service starting up...")
-    # Start Kafka consumer in background
-    from app.consumers.content_consumer import start_event_consumer
-    import asyncio
-    asyncio.create_task(start_event_consumer())
-    logger.info("AI Service started successfully")
-
 @app.get("/health")
 async def health_check():
     return {"status": "ok", "service": "ai-service"}
 
-```
+@app.get("/stats/gemini")
+async def gemini_stats():
+    from app.core.gemini_client import get_gemini_client
+    return get_gemini_client().stats()
+
+@app.get("/ready")
+async def readiness_check():
+    ready = model_registry.is_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "loading", "models": model_registry.status()}
+    )
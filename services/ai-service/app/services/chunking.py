@@ -0,0 +1,65 @@
+from typing import List
+import re
+
+# Same ~4 characters per token heuristic the Gemini client budgets with
+CHARS_PER_TOKEN = 4
+
+_PARAGRAPH = re.compile(r"\n\s*\n")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def _units(text: str, max_tokens: int, run_tokens: int) -> List[str]:
+    """Paragraphs, falling back to sentences and then word runs for oversized ones"""
+    units = []
+    for paragraph in _PARAGRAPH.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            units.append(paragraph)
+            continue
+        for sentence in _SENTENCE.split(paragraph):
+            if estimate_tokens(sentence) <= max_tokens:
+                units.append(sentence)
+                continue
+            run = []
+            for word in sentence.split():
+                if run and estimate_tokens(" ".join(run + [word])) > run_tokens:
+                    units.append(" ".join(run))
+                    run = []
+                run.append(word)
+            if run:
+                units.append(" ".join(run))
+    return units
+
+def chunk_text(text: str, max_tokens: int = 3000, overlap_tokens: int = 200) -> List[str]:
+    """
+    Split text into windows of at most ~max_tokens tokens on paragraph
+    (or sentence/word) boundaries. Each window after the first repeats
+    up to ~overlap_tokens of trailing text from the previous one, so
+    content cut at a boundary is still seen whole by one window.
+    """
+    # Word runs well under the overlap, so unpunctuated text still overlaps
+    units = _units(text, max_tokens, max(1, min(overlap_tokens, max_tokens) // 2))
+    sizes = [estimate_tokens(unit) + 1 for unit in units]  # +1 for the joining newline
+
+    chunks = []
+    start = 0
+    while start < len(units):
+        end, total = start, 0
+        while end < len(units) and (end == start or total + sizes[end] <= max_tokens):
+            total += sizes[end]
+            end += 1
+        chunks.append("\n\n".join(units[start:end]))
+        if end >= len(units):
+            break
+
+        # Step back over trailing units that fit in the overlap budget
+        next_start, overlap = end, 0
+        while next_start - 1 > start and overlap + sizes[next_start - 1] <= overlap_tokens:
+            next_start -= 1
+            overlap += sizes[next_start]
+        start = next_start
+    return chunks
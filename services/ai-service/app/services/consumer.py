@@ -1,77 +1,229 @@
 import json
+import math
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 from aiokafka import AIOKafkaConsumer
 from app.core.config import get_settings
 from app.core.redis_client import redis_client
 from app.core.kafka import get_kafka_producer
 from app.core.logging import setup_logging
+from app.core.models import model_registry
+from app.services.doomscroll_state import doomscroll_states
 import logging
-from ml_models.doomscroll import DoomscrollDetector
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
-# Initialize Detector
-detector = DoomscrollDetector()
+def _build_detector():
+    # Imported here so torch is only loaded when the model is
+    from ml_models.doomscroll import DoomscrollDetector
+    return DoomscrollDetector(
+        runtime=settings.DOOMSCROLL_RUNTIME,
+        num_threads=settings.DOOMSCROLL_NUM_THREADS
+    )
+
+model_registry.register("doomscroll", _build_detector)
+
+# Inference runs here, one batch at a time, so the event loop (and with it
+# Kafka fetching and heartbeats) keeps going while the model works
+_inference_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="doomscroll")
+
+# Sessions per user fed to the LSTM
+WINDOW_SIZE = 10
+
+# Pause before re-fetching a batch that failed
+RETRY_BACKOFF_SECONDS = 1.0
+
+# Numeric event fields the model reads, with the value used when one is absent
+NUMERIC_FIELDS = {'sessionDuration': 0, 'scrollDistance': 0, 'interactionCount': 0, 'batteryLevel': 100}
+
+def _screen_time_event(event_data) -> Optional[dict]:
+    """
+    The event with its numeric fields coerced to float, or None if it has
+    no userId or a field that is not a finite number (e.g. "n/a" or null)
+    """
+    if not isinstance(event_data, dict) or not event_data.get('userId'):
+        return None
+    event = dict(event_data)
+    for field, default in NUMERIC_FIELDS.items():
+        try:
+            event[field] = float(event.get(field, default))
+        except (TypeError, ValueError):
+            event[field] = math.nan
+        if not math.isfinite(event[field]):
+            logger.warning(f"Skipping screen-time event for User {event['userId']}: bad {field} {event_data.get(field)!r}")
+            return None
+    return event
 
-async def process_screen_time_event(event_data: dict):
-    user_id = event_data.get('userId')
-    if not user_id:
+async def process_screen_time_batch(events: List[dict]):
+    """
+    Update windows and score every user in a batch of screen-time events.
+
+    Events are validated and grouped by user (in arrival order), each
+    user's window is updated once, all windows go through the LSTM as one
+    padded batch, and interventions are published together. Malformed
+    events are skipped; if the batched pass still fails, users are scored
+    one at a time so one bad window cannot drop the rest.
+    """
+    by_user: Dict[str, List[dict]] = {}
+    for event_data in events:
+        event = _screen_time_event(event_data)
+        if event is not None:
+            by_user.setdefault(event['userId'], []).append(event)
+    if not by_user:
         return
 
     # 1. Windowing in Redis
-    # List key: user:{id}:screen_time_window
-    window_key = f"user:{user_id}:screen_time_window"
-    
-    # Add new event to list (Right Push)
-    await redis_client.rpush(window_key, json.dumps(event_data))
-    
-    # Keep only last 10 (Trim: start=-10, end=-1)
-    await redis_client.ltrim(window_key, -10, -1)
-    
-    # Get current window
-    window_raw = await redis_client.lrange(window_key, 0, -1)
-    window_data = [json.loads(x) for x in window_raw]
-    
+    users = list(by_user)
+    if settings.DOOMSCROLL_INCREMENTAL:
+        (windows, counts), states = await asyncio.gather(
+            _update_windows(by_user),
+            doomscroll_states.get_many(users)
+        )
+    else:
+        windows, counts = await _update_windows(by_user)
+
     # 2. Predict
-    result = detector.predict(window_data)
-    
-    logger.info(f"Doomscroll analysis for User {user_id}: {result['risk_level']} ({result['probability']:.2f})")
-    
+    detector = await model_registry.aget("doomscroll")
+    loop = asyncio.get_running_loop()
+    try:
+        if settings.DOOMSCROLL_INCREMENTAL:
+            results = await _predict_incremental(detector, by_user, windows, counts, states)
+        else:
+            results = await loop.run_in_executor(_inference_executor, detector.predict_batch, windows)
+    except Exception as e:
+        logger.error(f"Batched doomscroll scoring failed, scoring {len(users)} users one by one: {e}")
+        results = await loop.run_in_executor(_inference_executor, _predict_each, detector, users, windows)
+
     # 3. Trigger Intervention if HIGH risk
-    if result['risk_level'] in ['HIGH', 'CRITICAL']:
-        producer = await get_kafka_producer()
-        intervention_event = {
-            'type': 'INTERVENTION_TRIGGERED',
-            'data': {
-                'userId': user_id,
-                'reason': 'DOOMSCROLL_DETECTED',
-                'probability': result['probability'],
-                'riskLevel': result['risk_level'],
-                'appName': event_data.get('appPackageName'),
-                'timestamp': event_data.get('timestamp')
-            }
-        }
-        await producer.send_and_wait("intervention-events", json.dumps(intervention_event).encode('utf-8'))
-        logger.info(f"Published INTERVENTION_TRIGGERED for User {user_id}")
+    interventions = []
+    for user_id, result in zip(users, results):
+        if result is None:
+            continue
+        logger.info(f"Doomscroll analysis for User {user_id}: {result['risk_level']} ({result['probability']:.2f})")
+        if result['risk_level'] in ['HIGH', 'CRITICAL']:
+            latest = by_user[user_id][-1]
+            interventions.append({
+                'type': 'INTERVENTION_TRIGGERED',
+                'data': {
+                    'userId': user_id,
+                    'reason': 'DOOMSCROLL_DETECTED',
+                    'probability': result['probability'],
+                    'riskLevel': result['risk_level'],
+                    'appName': latest.get('appPackageName'),
+                    'timestamp': latest.get('timestamp')
+                }
+            })
+
+    if interventions:
+        await _publish_interventions(interventions)
+
+async def _update_windows(by_user: Dict[str, List[dict]]) -> Tuple[List[List[dict]], List[int]]:
+    """
+    Append each user's new events to their window and read the windows back,
+    for every user in one MULTI/EXEC round trip.
+
+    Returns:
+        The windows, and each user's running count of sessions
+    """
+    async with redis_client.pipeline(transaction=True) as pipe:
+        for user_id, events in by_user.items():
+            # List key: user:{id}:screen_time_window
+            window_key = f"user:{user_id}:screen_time_window"
+            pipe.rpush(window_key, *[json.dumps(event_data) for event_data in events])
+            # Keep only the last WINDOW_SIZE sessions
+            pipe.ltrim(window_key, -WINDOW_SIZE, -1)
+            # Idle users' windows expire
+            pipe.expire(window_key, settings.SCREEN_TIME_WINDOW_TTL)
+            pipe.lrange(window_key, 0, -1)
+            # Lets cached LSTM states tell whether they are up to date
+            count_key = f"user:{user_id}:screen_time_count"
+            pipe.incrby(count_key, len(events))
+            pipe.expire(count_key, settings.SCREEN_TIME_WINDOW_TTL)
+        replies = await pipe.execute()
 
+    # Six replies per user: the LRANGE is the fourth, the INCRBY the fifth
+    windows = [[json.loads(x) for x in window_raw] for window_raw in replies[3::6]]
+    return windows, replies[4::6]
+
+def _predict_each(detector, users: List[str], windows: List[List[dict]]) -> List[Optional[dict]]:
+    """Score windows one at a time; a window that still fails scores None"""
+    results = []
+    for user_id, window in zip(users, windows):
+        try:
+            results.append(detector.predict(window))
+        except Exception as e:
+            logger.error(f"Doomscroll scoring failed for User {user_id}: {e}")
+            results.append(None)
+    return results
+
+async def _predict_incremental(detector, by_user, windows, counts, states) -> List[dict]:
+    """Score by advancing each user's cached LSTM state over their new sessions only"""
+    new_counts = [len(events) for events in by_user.values()]
+    # A state is only usable if it has consumed exactly the sessions before this batch
+    states = [
+        state if state is not None and state["seen"] == count - new else None
+        for state, count, new in zip(states, counts, new_counts)
+    ]
+    loop = asyncio.get_running_loop()
+    results, new_states = await loop.run_in_executor(
+        _inference_executor,
+        detector.predict_incremental,
+        windows, new_counts, states, settings.DOOMSCROLL_STATE_REFRESH_STEPS
+    )
+
+    updates = {}
+    for user_id, state, count in zip(by_user, new_states, counts):
+        if state is not None:
+            state["seen"] = count
+            updates[user_id] = state
+    await doomscroll_states.set_many(updates)
+    return results
+
+async def _publish_interventions(interventions: List[dict]):
+    producer = await get_kafka_producer()
+    # Queue every send before waiting so they share producer batches
+    deliveries = [await producer.send("intervention-events", event) for event in interventions]
+    await asyncio.gather(*deliveries)
+    logger.info(f"Published {len(interventions)} INTERVENTION_TRIGGERED events")
 
 async def start_consumer():
     consumer = AIOKafkaConsumer(
         'screen-time-events',
         bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
         group_id="ai-service-group",
-        value_deserializer=lambda x: json.loads(x.decode('utf-8'))
+        value_deserializer=lambda x: json.loads(x.decode('utf-8')),
+        # Offsets are committed once a whole batch has been handled
+        enable_auto_commit=False
     )
     
     await consumer.start()
     try:
-        async for message in consumer:
+        while True:
+            batches = await consumer.getmany(
+                timeout_ms=settings.KAFKA_BATCH_TIMEOUT_MS,
+                max_records=settings.KAFKA_BATCH_MAX_RECORDS
+            )
+            if not batches:
+                continue
+
+            events = [
+                message.value.get('data')
+                for messages in batches.values()
+                for message in messages
+                if isinstance(message.value, dict) and message.value.get('type') == 'SCREEN_TIME_CAPTURED'
+            ]
             try:
-                msg_json = message.value
-                if msg_json.get('type') == 'SCREEN_TIME_CAPTURED':
-                    await process_screen_time_event(msg_json.get('data'))
+                if events:
+                    await process_screen_time_batch(events)
             except Exception as e:
-                logger.error(f"Error processing kafka message: {e}")
+                # Not committed: rewind so the batch is fetched again (e.g. after a Redis outage)
+                logger.error(f"Error processing kafka batch of {len(events)} events, retrying: {e}")
+                for partition, messages in batches.items():
+                    consumer.seek(partition, messages[0].offset)
+                await asyncio.sleep(RETRY_BACKOFF_SECONDS)
+                continue
+            await consumer.commit()
     finally:
         await consumer.stop()
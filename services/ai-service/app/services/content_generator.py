@@ -1,5 +1,5 @@
-from typing import Dict, Any, List
-from app.core.gemini_client import get_gemini_client
+from typing import Dict, Any, AsyncIterator, List
+from app.core.gemini_client import expect_type, get_gemini_client, parse_json_text
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
@@ -26,6 +26,48 @@ class ContentGenerator:
             Structured theory content
         """
         
+        prompt = self._theory_prompt(topic_name, mastery_level)
+        
+        try:
+            content = await self.gemini.generate_json(prompt, cache="theory", validate=expect_type(dict))
+            return content
+        except Exception as e:
+            logger.error(f"Theory generation failed: {str(e)}")
+            return self._theory_fallback(topic_name)
+    
+    async def stream_theory(
+        self, 
+        topic_name: str, 
+        mastery_level: int
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream theory content for a topic as it is generated
+        
+        Args:
+            topic_name: Name of the topic
+            mastery_level: User's current mastery (1-5)
+            
+        Yields:
+            {"type": "delta", "text": ...} chunks of the raw JSON reply, then
+            {"type": "done", "content": ...} with the parsed theory (or the fallback)
+        """
+        
+        # Same prompt and cache policy as generate_theory(), so both read one cache entry
+        prompt = self._theory_prompt(topic_name, mastery_level)
+        parts = []
+        
+        try:
+            async for text in self.gemini.generate_json_stream(prompt, cache="theory", validate=expect_type(dict)):
+                parts.append(text)
+                yield {"type": "delta", "text": text}
+            content = parse_json_text("".join(parts))
+        except Exception as e:
+            logger.error(f"Theory streaming failed: {str(e)}")
+            content = self._theory_fallback(topic_name)
+        
+        yield {"type": "done", "content": content}
+    
+    def _theory_prompt(self, topic_name: str, mastery_level: int) -> str:
         difficulty_map = {
             1: "beginner-friendly with basic examples",
             2: "intermediate with some technical details",
@@ -36,7 +78,7 @@ class ContentGenerator:
         
         difficulty_desc = difficulty_map.get(mastery_level, "intermediate")
         
-        prompt = f"""Create educational content about: {topic_name}
+        return f"""Create educational content about: {topic_name}
 Level: {difficulty_desc}
 
 Return a JSON object with this structure:
@@ -55,24 +97,20 @@ Return a JSON object with this structure:
 
 Make it educational, clear, and appropriate for the mastery level.
 """
-        
-        try:
-            content = await self.gemini.generate_json(prompt)
-            return content
-        except Exception as e:
-            logger.error(f"Theory generation failed: {str(e)}")
-            return {
-                "title": topic_name,
-                "introduction": f"Introduction to {topic_name}",
-                "keyPoints": [
-                    {
-                        "point": "Key Concept",
-                        "explanation": "Detailed explanation will be generated."
-                    }
-                ],
-                "summary": "Summary of key concepts",
-                "practiceHints": []
-            }
+    
+    def _theory_fallback(self, topic_name: str) -> Dict[str, Any]:
+        return {
+            "title": topic_name,
+            "introduction": f"Introduction to {topic_name}",
+            "keyPoints": [
+                {
+                    "point": "Key Concept",
+                    "explanation": "Detailed explanation will be generated."
+                }
+            ],
+            "summary": "Summary of key concepts",
+            "practiceHints": []
+        }
     
     async def generate_quiz(
         self, 
@@ -107,7 +145,7 @@ Make the question challenging but fair for the difficulty level.
 """
         
         try:
-            quiz = await self.gemini.generate_json(prompt)
+            quiz = await self.gemini.generate_json(prompt, cache="quiz")
             return quiz
         except Exception as e:
             logger.error(f"Quiz generation failed: {str(e)}")
@@ -152,7 +190,7 @@ Make flashcards that test understanding and recall.
 """
         
         try:
-            flashcards = await self.gemini.generate_json(prompt)
+            flashcards = await self.gemini.generate_json(prompt, validate=expect_type(list))
             if isinstance(flashcards, list):
                 return flashcards
             return []
@@ -1,9 +1,14 @@
 from typing import Dict, Any, List, Optional
-from app.core.gemini_client import get_gemini_client
+from app.core.gemini_client import expect_type, get_gemini_client
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
 
+def _has_modules(curriculum: Any):
+    """validate= hook: a curriculum needs a list of modules"""
+    if not isinstance(curriculum, dict) or not isinstance(curriculum.get('modules'), list):
+        raise ValueError("Invalid curriculum structure")
+
 class CurriculumGenerator:
     """Generate comprehensive curricula using Gemini AI"""
     
@@ -68,11 +73,10 @@ Make the curriculum comprehensive and aligned with {exam_name} exam requirements
 """
         
         try:
-            curriculum = await self.gemini.generate_json(prompt)
+            curriculum = await self.gemini.generate_json(prompt, validate=_has_modules)
             
             # Validate basic structure
-            if not isinstance(curriculum.get('modules'), list):
-                raise ValueError("Invalid curriculum structure")
+            _has_modules(curriculum)
             
             return curriculum
         except Exception as e:
@@ -179,7 +183,7 @@ If no issues, return an empty array.
 """
         
         try:
-            issues = await self.gemini.generate_json(prompt)
+            issues = await self.gemini.generate_json(prompt, validate=expect_type(list))
             if isinstance(issues, list):
                 return issues
             return []
@@ -0,0 +1,85 @@
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+import numpy as np
+from app.core.config import get_settings
+from app.core.redis_client import redis_client, redis_binary_client
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+settings = get_settings()
+
+def sha256_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class DocumentCache:
+    """
+    Processed-document results keyed by the SHA-256 of the uploaded bytes.
+
+    The JSON entry holds the analysis (structure, topics, flashcards,
+    analytics) plus the retrieval passages; their embeddings are stored
+    beside it as one float32 matrix so a known document can be indexed
+    for another user without re-embedding. Keys include the settings that
+    shape the output, so changing the chunking or models starts afresh.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        fingerprint = json.dumps([
+            settings.DOCUMENT_CHUNK_TOKENS,
+            settings.DOCUMENT_CHUNK_OVERLAP_TOKENS,
+            settings.DOCUMENT_MAX_TOPICS,
+            settings.DOCUMENT_FLASHCARD_CHUNKS,
+            settings.EMBEDDING_MODEL,
+            settings.EMBEDDING_BACKEND
+        ])
+        self.prefix = f"document:{hashlib.sha256(fingerprint.encode()).hexdigest()[:12]}"
+        self.stats = {"hits": 0, "misses": 0}
+
+    async def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        """Cached entry with "embeddings" as an (n, dim) array, or None"""
+        try:
+            raw = await redis_client.get(f"{self.prefix}:result:{digest}")
+            if raw is None:
+                self.stats["misses"] += 1
+                return None
+            entry = json.loads(raw)
+            blob = await redis_binary_client.get(f"{self.prefix}:embeddings:{digest}")
+        except Exception as e:
+            logger.warning(f"Document cache read failed: {str(e)}")
+            return None
+
+        entry["embeddings"] = None
+        if blob and entry["passages"]:
+            entry["embeddings"] = np.frombuffer(blob, dtype="<f4").reshape(len(entry["passages"]), -1)
+        self.stats["hits"] += 1
+        return entry
+
+    async def set(
+        self,
+        digest: str,
+        result: Dict[str, Any],
+        passages: List[str],
+        embeddings: Optional[Any] = None
+    ):
+        entry = {"result": result, "passages": passages}
+        try:
+            await redis_client.setex(f"{self.prefix}:result:{digest}", self.ttl, json.dumps(entry))
+            if embeddings is not None:
+                await self.set_embeddings(digest, embeddings)
+        except Exception as e:
+            logger.warning(f"Document cache write failed: {str(e)}")
+
+    async def set_embeddings(self, digest: str, embeddings: Any):
+        blob = np.asarray(embeddings, dtype="<f4").tobytes()
+        try:
+            await redis_binary_client.setex(f"{self.prefix}:embeddings:{digest}", self.ttl, blob)
+        except Exception as e:
+            logger.warning(f"Document cache write failed: {str(e)}")
+
+# Global instance
+document_cache = DocumentCache(settings.DOCUMENT_CACHE_TTL)
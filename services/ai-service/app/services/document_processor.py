@@ -1,18 +1,37 @@
 import os
-import io
-from typing import Dict, Any, List, Optional
-from app.core.gemini_client import get_gemini_client
+import asyncio
+import hashlib
+import importlib.util
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, Set, Callable, Awaitable, Tuple
+from app.core.gemini_client import expect_type, get_gemini_client
+from app.core.config import get_settings
+from app.services.chunking import chunk_text
+from app.services.document_cache import document_cache, sha256_file
+from app.services.embedding import embedding_service
+from app.services.pdf_extraction import pdf_extractor
+from app.services.rag_engine import rag_engine
 from app.core.logging import get_logger
 
 logger = get_logger(__name__)
+settings = get_settings()
 
-# Try to import pypdf, fallback gracefully if not available
-try:
-    from pypdf import PdfReader
-    PDF_SUPPORT = True
-except ImportError:
+IMPORTANCE_RANK = {"high": 3, "medium": 2, "low": 1}
+
+# Stages that returned a fallback during the current process_document() call
+_fallbacks: ContextVar[Optional[Set[str]]] = ContextVar("document_stage_fallbacks", default=None)
+
+# pypdf is only imported by pdf_extractor's worker processes; just check it is installed
+PDF_SUPPORT = importlib.util.find_spec("pypdf") is not None
+if not PDF_SUPPORT:
     logger.warning("pypdf not installed, PDF processing will be limited")
-    PDF_SUPPORT = False
+
+def _has_chapters(structure: Any):
+    """validate= hook: a merged structure is only usable with chapters"""
+    if not isinstance(structure, dict) or not structure.get("chapters"):
+        raise ValueError("Structure has no chapters")
 
 class DocumentProcessor:
     """Process documents using real AI (Gemini) for structure extraction and analysis"""
@@ -24,51 +43,180 @@ class DocumentProcessor:
         self, 
         file_path: Optional[str] = None, 
         file_content: Optional[bytes] = None, 
-        file_type: str = "txt"
+        file_type: str = "txt",
+        user_id: Optional[str] = None,
+        topic_id: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        content_hash: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Main entry point for document processing with real AI
         
+        The whole document is analysed: text longer than one window is
+        split into overlapping token-bounded chunks that are analysed
+        concurrently (map) and merged into one structure, topic list and
+        flashcard set (reduce). Results are cached by the SHA-256 of the
+        file, so a re-upload of the same bytes skips extraction and Gemini.
+        A result in which any stage fell back (e.g. Gemini was unavailable)
+        is returned but not cached, so the next upload tries again.
+        
         Args:
             file_path: Path to document file
             file_content: Raw file content as bytes
             file_type: Type of file (txt, pdf, etc.)
+            user_id: With topic_id, also embed and index the document for RAG
+            topic_id: Topic to index the document under
+            metadata: Extra metadata stored with every indexed chunk
+            content_hash: SHA-256 of the file if the caller already has it
             
         Returns:
-            Processed document with structure, topics, and analytics
+            Processed document with structure, topics, analytics, the RAG
+            documentId (None unless indexed), whether it came from the
+            cache, and per-stage timings (ms)
         """
         try:
+            start = time.perf_counter()
+            digest = content_hash or await self._content_hash(file_path, file_content)
+            cached = await document_cache.get(digest) if digest else None
+            if cached is not None:
+                return await self._from_cache(digest, cached, user_id, topic_id, metadata, start)
+            
             # 1. Extract Text
-            text = self._extract_text(file_path, file_content, file_type)
+            start = time.perf_counter()
+            text = await self._extract_text(file_path, file_content, file_type)
+            extract_ms = round((time.perf_counter() - start) * 1000, 1)
             
             if not text or len(text.strip()) < 10:
                 raise ValueError("Extracted text is too short or empty")
             
-            # 2. Extract Structure using Gemini
-            structure = await self._extract_structure(text)
+            chunks = chunk_text(text, settings.DOCUMENT_CHUNK_TOKENS, settings.DOCUMENT_CHUNK_OVERLAP_TOKENS)
+            
+            # 2. Gemini stages as a DAG
+            if len(chunks) == 1:
+                # Structure and topics are independent, flashcards need the topics
+                stages = {
+                    "structure": (lambda: self._extract_structure(text), []),
+                    "topics": (lambda: self._extract_topics(text), []),
+                    "flashcards": (lambda topics: self._generate_flashcards(text, topics), ["topics"])
+                }
+            else:
+                stages = {
+                    "map": (lambda: self._map_chunks(chunks), []),
+                    "structure": (self._reduce_structure, ["map"]),
+                    "topics": (self._reduce_topics, ["map"]),
+                    "flashcards": (
+                        lambda analyses, topics: self._reduce_flashcards(chunks, analyses, topics),
+                        ["map", "topics"]
+                    )
+                }
             
-            # 3. Extract Topics using Gemini
-            topics = await self._extract_topics(text, structure)
+            # Retrieval passages are embedded from the same text, alongside the Gemini stages
+            passages = rag_engine.chunk_text(text)
+            if user_id and topic_id:
+                stages["embed"] = (lambda: self._embed_passages(passages), [])
             
-            # 4. Generate Flashcards using Gemini
-            flashcards = await self._generate_flashcards(text, topics)
+            fallbacks: Set[str] = set()
+            token = _fallbacks.set(fallbacks)
+            try:
+                results, timings = await self._run_stages(stages)
+            finally:
+                _fallbacks.reset(token)
+            embeddings = results.get("embed")
             
-            # 5. Calculate Analytics
+            # 3. Calculate Analytics
             analytics = self._calculate_analytics(text)
+            analytics["chunk_count"] = len(chunks)
             
-            return {
-                "structure": structure,
-                "topics": topics,
+            timings = {"extract_text": extract_ms, **timings}
+            logger.info(f"Document processed, stage timings (ms): {timings}")
+            
+            result = {
+                "structure": results["structure"],
+                "topics": results["topics"],
                 "curriculum": {"modules": []},  # Can be enhanced later
-                "flashcards": flashcards,
+                "flashcards": results["flashcards"],
                 "practice_questions": [],  # Can be enhanced later
                 "analytics": analytics
             }
+            if fallbacks:
+                logger.warning(f"Not caching document result, stages fell back: {sorted(fallbacks)}")
+            elif digest:
+                await document_cache.set(digest, result, passages, embeddings)
+            
+            document_id = None
+            if embeddings is not None:
+                document_id = await self._index(user_id, topic_id, digest, passages, embeddings, metadata)
+            
+            return {**result, "documentId": document_id, "cached": False, "timings": timings}
         except Exception as e:
             logger.error(f"Document processing failed: {str(e)}")
             raise
     
-    def _extract_text(
+    async def _content_hash(self, file_path: Optional[str], content: Optional[bytes]) -> Optional[str]:
+        if content:
+            return hashlib.sha256(content).hexdigest()
+        if file_path and os.path.exists(file_path):
+            return await asyncio.to_thread(sha256_file, file_path)
+        return None
+    
+    async def _from_cache(
+        self,
+        digest: str,
+        cached: Dict[str, Any],
+        user_id: Optional[str],
+        topic_id: Optional[str],
+        metadata: Optional[Dict[str, Any]],
+        start: float
+    ) -> Dict[str, Any]:
+        """Serve a known document, indexing its cached passages for this user"""
+        document_id = None
+        if user_id and topic_id and cached["passages"]:
+            embeddings = cached["embeddings"]
+            if embeddings is None:
+                # First upload was not indexed: embed once and keep them
+                embeddings = await self._embed_passages(cached["passages"])
+                if embeddings is not None:
+                    await document_cache.set_embeddings(digest, embeddings)
+            if embeddings is not None:
+                document_id = await self._index(user_id, topic_id, digest, cached["passages"], embeddings, metadata)
+        
+        timings = {"cache": round((time.perf_counter() - start) * 1000, 1)}
+        logger.info(f"Document {digest[:12]} served from cache in {timings['cache']}ms")
+        return {**cached["result"], "documentId": document_id, "cached": True, "timings": timings}
+    
+    async def _run_stages(
+        self,
+        stages: Dict[str, Tuple[Callable[..., Awaitable[Any]], List[str]]]
+    ) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """
+        Run a small dependency DAG of async stages concurrently
+        
+        Args:
+            stages: name -> (fn, dependencies), listed in dependency order;
+                fn is called with the dependencies' results as positional args
+            
+        Returns:
+            Results and wall-clock milliseconds per stage (excluding time
+            spent waiting on dependencies)
+        """
+        tasks: Dict[str, asyncio.Task] = {}
+        timings: Dict[str, float] = {}
+        
+        async def run(name: str, fn, dependencies: List[str]):
+            inputs = [await tasks[dep] for dep in dependencies]
+            start = time.perf_counter()
+            try:
+                return await fn(*inputs)
+            finally:
+                timings[name] = round((time.perf_counter() - start) * 1000, 1)
+        
+        async with asyncio.TaskGroup() as group:
+            for name, (fn, dependencies) in stages.items():
+                tasks[name] = group.create_task(run(name, fn, dependencies))
+        
+        return {name: task.result() for name, task in tasks.items()}, timings
+    
+    async def _extract_text(
         self, 
         file_path: Optional[str], 
         content: Optional[bytes], 
@@ -80,21 +228,14 @@ class DocumentProcessor:
         if file_type.lower() == 'pdf' and PDF_SUPPORT:
             try:
                 if content:
-                    pdf_file = io.BytesIO(content)
+                    source = content
                 elif file_path and os.path.exists(file_path):
-                    pdf_file = open(file_path, 'rb')
+                    source = file_path
                 else:
                     raise ValueError("No PDF content provided")
                 
-                reader = PdfReader(pdf_file)
-                text_parts = []
-                for page in reader.pages:
-                    text_parts.append(page.extract_text())
-                
-                if isinstance(pdf_file, io.IOBase) and hasattr(pdf_file, 'close'):
-                    pdf_file.close()
-                
-                return '\n\n'.join(text_parts)
+                # Parsed in worker processes so the event loop keeps serving
+                return await pdf_extractor.extract(source)
             except Exception as e:
                 logger.error(f"PDF extraction failed: {str(e)}")
                 raise
@@ -119,9 +260,6 @@ class DocumentProcessor:
     async def _extract_structure(self, text: str) -> Dict[str, Any]:
         """Extract document structure using Gemini AI"""
         
-        # Limit text for API call (first 4000 chars for structure)
-        text_sample = text[:4000] if len(text) > 4000 else text
-        
         prompt = f"""Analyze this document and extract its hierarchical structure.
 Return a JSON object with the following format:
 {{
@@ -143,14 +281,15 @@ Return a JSON object with the following format:
 }}
 
 Document text:
-{text_sample}
+{text}
 """
         
         try:
-            structure = await self.gemini.generate_json(prompt)
+            structure = await self.gemini.generate_json(prompt, priority="background", validate=expect_type(dict))
             return structure
         except Exception as e:
             logger.error(f"Structure extraction failed: {str(e)}")
+            self._fell_back("structure")
             # Fallback to basic structure
             return {
                 "documentType": "unknown",
@@ -169,12 +308,10 @@ Document text:
     async def _extract_topics(
         self, 
         text: str, 
-        structure: Dict[str, Any]
+        structure: Optional[Dict[str, Any]] = None
     ) -> List[Dict[str, Any]]:
         """Extract key topics using Gemini AI"""
         
-        text_sample = text[:3000] if len(text) > 3000 else text
-        
         prompt = f"""Analyze this document and extract the main topics/concepts.
 Return a JSON array of topics with this format:
 [
@@ -187,16 +324,17 @@ Return a JSON array of topics with this format:
 ]
 
 Document text:
-{text_sample}
+{text}
 """
         
         try:
-            topics = await self.gemini.generate_json(prompt)
+            topics = await self.gemini.generate_json(prompt, priority="background", validate=expect_type(list))
             if isinstance(topics, list):
                 return topics
-            return []
+            raise ValueError("Expected a JSON array")
         except Exception as e:
             logger.error(f"Topic extraction failed: {str(e)}")
+            self._fell_back("topics")
             return []
     
     async def _generate_flashcards(
@@ -209,7 +347,6 @@ Document text:
         if not topics:
             return []
         
-        text_sample = text[:2000] if len(text) > 2000 else text
         topics_str = ', '.join([t.get('name', '') for t in topics[:3]])
         
         prompt = f"""Generate 5 flashcards for learning about: {topics_str}
@@ -224,18 +361,252 @@ Return a JSON array with this format:
 ]
 
 Based on this content:
-{text_sample}
+{text}
 """
         
         try:
-            flashcards = await self.gemini.generate_json(prompt)
+            flashcards = await self.gemini.generate_json(prompt, priority="background", validate=expect_type(list))
             if isinstance(flashcards, list):
                 return flashcards
-            return []
+            raise ValueError("Expected a JSON array")
         except Exception as e:
             logger.error(f"Flashcard generation failed: {str(e)}")
+            self._fell_back("flashcards")
             return []
     
+    async def _map_chunks(self, chunks: List[str]) -> List[Dict[str, Any]]:
+        """Analyse every chunk, at most DOCUMENT_MAP_CONCURRENCY at a time"""
+        semaphore = asyncio.Semaphore(settings.DOCUMENT_MAP_CONCURRENCY)
+        
+        async def analyse(position: int, chunk: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._analyze_chunk(chunk, position, len(chunks))
+        
+        return await asyncio.gather(*(analyse(i, chunk) for i, chunk in enumerate(chunks)))
+    
+    async def _analyze_chunk(self, text: str, position: int, total: int) -> Dict[str, Any]:
+        """Sections and topics of one chunk in a single Gemini call"""
+        
+        # No part number in the prompt: identical chunks in other documents
+        # (re-exports, new editions) then share the Gemini response cache
+        prompt = f"""This is an excerpt from a longer document.
+Extract the sections it covers and its main topics/concepts.
+Return a JSON object with this format:
+{{
+  "sections": [
+    {{
+      "title": "Section title",
+      "summary": "Brief summary",
+      "topics": ["topic1", "topic2"]
+    }}
+  ],
+  "topics": [
+    {{
+      "name": "Topic name",
+      "difficulty": 1-5,
+      "importance": "high|medium|low",
+      "description": "Brief description"
+    }}
+  ]
+}}
+
+Document text:
+{text}
+"""
+        
+        try:
+            analysis = await self.gemini.generate_json(
+                prompt, cache="document", priority="background", validate=expect_type(dict)
+            )
+            if not isinstance(analysis, dict):
+                raise ValueError("Expected a JSON object")
+            return {
+                "sections": [s for s in analysis.get("sections", []) if isinstance(s, dict)],
+                "topics": [t for t in analysis.get("topics", []) if isinstance(t, dict) and t.get("name")]
+            }
+        except Exception as e:
+            logger.error(f"Chunk {position + 1}/{total} analysis failed: {str(e)}")
+            self._fell_back("map")
+            return {"sections": [], "topics": []}
+    
+    async def _reduce_structure(self, analyses: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Merge per-chunk sections into one hierarchical structure"""
+        
+        outline = self._outline(analyses, with_summaries=True)
+        if len(outline) > settings.DOCUMENT_CHUNK_TOKENS * 4:
+            outline = self._outline(analyses, with_summaries=False)[:settings.DOCUMENT_CHUNK_TOKENS * 4]
+        
+        prompt = f"""Below is an outline of a document, listed part by part in reading order.
+Merge it into the document's hierarchical structure (adjacent parts often
+continue the same chapter or section).
+Return a JSON object with the following format:
+{{
+  "documentType": "textbook|article|notes|other",
+  "title": "Document title",
+  "chapters": [
+    {{
+      "title": "Chapter title",
+      "pageRange": [start, end],
+      "sections": [
+        {{
+          "title": "Section title",
+          "summary": "Brief summary",
+          "topics": ["topic1", "topic2"]
+        }}
+      ]
+    }}
+  ]
+}}
+
+Outline:
+{outline}
+"""
+        
+        try:
+            structure = await self.gemini.generate_json(prompt, priority="background", validate=_has_chapters)
+            if isinstance(structure, dict) and structure.get("chapters"):
+                return structure
+            raise ValueError("Structure has no chapters")
+        except Exception as e:
+            logger.error(f"Structure reduction failed: {str(e)}")
+            self._fell_back("structure")
+            # Fallback: one chapter per chunk, as analysed
+            return {
+                "documentType": "unknown",
+                "title": "Untitled Document",
+                "chapters": [
+                    {
+                        "title": f"Part {i + 1}",
+                        "pageRange": [i + 1, i + 1],
+                        "sections": analysis["sections"]
+                    }
+                    for i, analysis in enumerate(analyses)
+                    if analysis["sections"]
+                ]
+            }
+    
+    @staticmethod
+    def _fell_back(stage: str):
+        """Mark the current document's result as degraded (not cacheable)"""
+        fallbacks = _fallbacks.get()
+        if fallbacks is not None:
+            fallbacks.add(stage)
+    
+    @staticmethod
+    def _outline(analyses: List[Dict[str, Any]], with_summaries: bool) -> str:
+        lines = []
+        for i, analysis in enumerate(analyses):
+            lines.append(f"Part {i + 1}:")
+            for section in analysis["sections"]:
+                line = f"- {section.get('title', '')}"
+                if with_summaries and section.get("summary"):
+                    line += f": {str(section['summary'])[:200]}"
+                lines.append(line)
+        return "\n".join(lines)
+    
+    async def _reduce_topics(self, analyses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Merge per-chunk topics by name, most important and most frequent first"""
+        merged: Dict[str, Dict[str, Any]] = {}
+        for analysis in analyses:
+            for topic in analysis["topics"]:
+                key = str(topic["name"]).strip().lower()
+                entry = merged.setdefault(key, {"topic": dict(topic), "count": 0, "difficulties": []})
+                entry["count"] += 1
+                if isinstance(topic.get("difficulty"), (int, float)):
+                    entry["difficulties"].append(topic["difficulty"])
+                importance = topic.get("importance")
+                if IMPORTANCE_RANK.get(importance, 0) > IMPORTANCE_RANK.get(entry["topic"].get("importance"), 0):
+                    entry["topic"]["importance"] = importance
+                if not entry["topic"].get("description") and topic.get("description"):
+                    entry["topic"]["description"] = topic["description"]
+        
+        ranked = sorted(
+            merged.values(),
+            key=lambda e: (IMPORTANCE_RANK.get(e["topic"].get("importance"), 0), e["count"]),
+            reverse=True
+        )
+        topics = []
+        for entry in ranked[:settings.DOCUMENT_MAX_TOPICS]:
+            topic = entry["topic"]
+            if entry["difficulties"]:
+                topic["difficulty"] = round(sum(entry["difficulties"]) / len(entry["difficulties"]))
+            topics.append(topic)
+        return topics
+    
+    async def _reduce_flashcards(
+        self,
+        chunks: List[str],
+        analyses: List[Dict[str, Any]],
+        topics: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Flashcards for the top topics, each generated from a chunk that covers them"""
+        
+        # Group the top topics by the first chunk they were found in
+        groups: Dict[int, List[Dict[str, Any]]] = {}
+        for topic in topics:
+            key = str(topic["name"]).strip().lower()
+            for i, analysis in enumerate(analyses):
+                if any(str(t["name"]).strip().lower() == key for t in analysis["topics"]):
+                    if i in groups or len(groups) < settings.DOCUMENT_FLASHCARD_CHUNKS:
+                        groups.setdefault(i, []).append(topic)
+                    break
+        
+        semaphore = asyncio.Semaphore(settings.DOCUMENT_MAP_CONCURRENCY)
+        
+        async def generate(i: int, group: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            async with semaphore:
+                return await self._generate_flashcards(chunks[i], group)
+        
+        batches = await asyncio.gather(*(generate(i, group) for i, group in sorted(groups.items())))
+        
+        flashcards, seen = [], set()
+        for batch in batches:
+            for card in batch:
+                front = str(card.get("front", "")).strip().lower()
+                if front and front not in seen:
+                    seen.add(front)
+                    flashcards.append(card)
+        return flashcards
+    
+    async def _embed_passages(self, passages: List[str]) -> Optional[List[List[float]]]:
+        """
+        Passage embeddings, or None if they could not be computed. The
+        embedding service falls back to zero vectors rather than raising;
+        those must not be indexed or cached, so they count as a failure.
+        """
+        try:
+            embeddings = await embedding_service.generate_batch_embeddings(passages)
+        except Exception as e:
+            logger.error(f"Passage embedding failed: {str(e)}")
+            return None
+        if any(not any(row) for row in embeddings):
+            logger.error("Passage embedding fell back to zero vectors; not indexing or caching them")
+            return None
+        return embeddings
+    
+    async def _index(
+        self,
+        user_id: str,
+        topic_id: str,
+        digest: Optional[str],
+        passages: List[str],
+        embeddings: Any,
+        metadata: Optional[Dict[str, Any]]
+    ) -> Optional[str]:
+        """
+        Add embedded passages to the user's RAG index
+        
+        The id is derived from user, topic and content hash, so uploading
+        the same file to the same topic again replaces its passages
+        instead of adding a second copy.
+        """
+        document_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{user_id}:{topic_id}:{digest}")) if digest else None
+        try:
+            return await rag_engine.add_chunks(user_id, topic_id, passages, embeddings, metadata, document_id)
+        except Exception as e:
+            logger.error(f"Document indexing failed: {str(e)}")
+            return None
+    
     def _calculate_analytics(self, text: str) -> Dict[str, Any]:
         """Calculate basic document analytics"""
         words = text.split()
@@ -0,0 +1,61 @@
+from typing import Any, Dict, List, Optional
+import struct
+import numpy as np
+from app.core.config import get_settings
+from app.core.redis_client import redis_binary_client
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+settings = get_settings()
+
+# sessions consumed (the user's session counter), steps since recompute, LSTM layers
+_HEADER = struct.Struct("<QII")
+
+class DoomscrollStateStore:
+    """
+    Per-user LSTM (h, c) for incremental doomscroll scoring.
+
+    Each entry is a 16-byte header followed by h and c as raw float32
+    (~1 KiB for the 2x64 model). "seen" records how many of the user's
+    sessions the state has consumed, so a state that missed a batch (or
+    was overtaken by another replica) can be told apart and rebuilt.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(user_id: str) -> str:
+        return f"user:{user_id}:doomscroll_state"
+
+    @staticmethod
+    def encode(state: Dict[str, Any]) -> bytes:
+        h = np.asarray(state["h"], dtype="<f4")
+        c = np.asarray(state["c"], dtype="<f4")
+        return _HEADER.pack(state["seen"], state["steps"], h.shape[0]) + h.tobytes() + c.tobytes()
+
+    @staticmethod
+    def decode(blob: bytes) -> Dict[str, Any]:
+        seen, steps, layers = _HEADER.unpack_from(blob)
+        h, c = np.frombuffer(blob, dtype="<f4", offset=_HEADER.size).reshape(2, layers, -1)
+        return {"seen": seen, "steps": steps, "h": h, "c": c}
+
+    async def get_many(self, user_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        try:
+            blobs = await redis_binary_client.mget([self._key(user_id) for user_id in user_ids])
+        except Exception as e:
+            logger.warning(f"Doomscroll state read failed: {str(e)}")
+            return [None] * len(user_ids)
+        return [self.decode(blob) if blob else None for blob in blobs]
+
+    async def set_many(self, states: Dict[str, Dict[str, Any]]):
+        try:
+            async with redis_binary_client.pipeline(transaction=False) as pipe:
+                for user_id, state in states.items():
+                    pipe.setex(self._key(user_id), self.ttl, self.encode(state))
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Doomscroll state write failed: {str(e)}")
+
+# Global instance; states live as long as the windows they summarise
+doomscroll_states = DoomscrollStateStore(settings.SCREEN_TIME_WINDOW_TTL)
@@ -1,23 +1,62 @@
-from typing import List
-from sentence_transformers import SentenceTransformer
-from app.core.redis_client import redis_client
+from typing import List, Dict, Optional
+from app.core.redis_client import redis_binary_client
+from app.core.config import get_settings
 from app.core.logging import get_logger
-import json
+from app.core.models import model_registry
+from app.services.embedding_codec import ENCODINGS, encode_embedding, decode_embedding, encoded_size
+from app.services.micro_batcher import MicroBatcher
+from app.services.embedding_backends import create_backend
 import hashlib
 
 logger = get_logger(__name__)
+settings = get_settings()
+
+model_registry.register(
+    "embedding",
+    lambda: create_backend(
+        settings.EMBEDDING_BACKEND,
+        settings.EMBEDDING_MODEL,
+        onnx_file=settings.EMBEDDING_ONNX_FILE
+    )
+)
 
 class EmbeddingService:
     """Generate real embeddings using Sentence Transformers with Redis caching"""
     
     def __init__(self):
-        # Use a lightweight, fast model
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.dimension = 384  # MiniLM embedding dimension
-        self.cache_ttl = 86400  # 24 hours
-        logger.info(f"Embedding service initialized with model all-MiniLM-L6-v2 (dim={self.dimension})")
+        # Use a lightweight, fast model; the inference backend is pluggable and
+        # only loaded on first use (or by the startup warm-up)
+        self.cache_ttl = settings.EMBEDDING_CACHE_TTL
+        if settings.EMBEDDING_CACHE_ENCODING not in ENCODINGS:
+            raise ValueError(f"Unknown EMBEDDING_CACHE_ENCODING: {settings.EMBEDDING_CACHE_ENCODING}")
+        self.cache_encoding = settings.EMBEDDING_CACHE_ENCODING
+        # Encode requests from concurrent coroutines are merged and run off the event loop
+        self.batcher = MicroBatcher(
+            self._encode_batch,
+            max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE,
+            max_wait_ms=settings.EMBEDDING_BATCH_MAX_WAIT_MS
+        )
+    
+    @property
+    def backend(self):
+        return model_registry.get("embedding")
+    
+    @property
+    def dimension(self) -> int:
+        return self.backend.get_dimension()  # 384 for MiniLM
     
-    def generate_embedding(self, text: str) -> List[float]:
+    def _encode_batch(self, texts: List[str]):
+        """Runs in the batcher's worker thread"""
+        return self.backend.encode(texts)
+    
+    def _cache_key(self, text: str) -> str:
+        text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        # Model, backend and encoding are part of the key so vectors from a
+        # different configuration are never misread. The backend is the one
+        # that actually loaded (onnx falls back to torch when unavailable).
+        return f"embedding:{settings.EMBEDDING_MODEL}:{self.backend.name}:{self.cache_encoding}:{text_hash}"
+    
+    async def generate_embedding(self, text: str) -> List[float]:
         """
         Generate embedding vector for text with Redis caching
         
@@ -29,62 +68,91 @@ class EmbeddingService:
         """
         if not text or not text.strip():
             logger.warning("Empty text provided for embedding")
-            return [0.0] * self.dimension
-        
-        # Create cache key from text hash
-        text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
-        cache_key = f"embedding:{text_hash}"
         
-        # Check Redis cache
-        try:
-            cached = redis_client.get(cache_key)
-            if cached:
-                logger.debug(f"Cache hit for embedding")
-                return json.loads(cached)
-        except Exception as e:
-            logger.warning(f"Redis cache read failed: {str(e)}")
-        
-        # Generate real embedding
-        try:
-            embedding = self.model.encode(text, convert_to_numpy=True)
-            embedding_list = embedding.tolist()
-            
-            # Cache the result
-            try:
-                redis_client.setex(
-                    cache_key, 
-                    self.cache_ttl, 
-                    json.dumps(embedding_list)
-                )
-                logger.debug(f"Cached embedding for 24 hours")
-            except Exception as e:
-                logger.warning(f"Redis cache write failed: {str(e)}")
-            
-            return embedding_list
-        except Exception as e:
-            logger.error(f"Embedding generation failed: {str(e)}")
-            # Return zero vector as fallback
-            return [0.0] * self.dimension
+        embeddings = await self.generate_batch_embeddings([text])
+        return embeddings[0]
     
-    def generate_batch_embeddings(self, texts: List[str]) -> List[List[float]]:
+    async def generate_batch_embeddings(self, texts: List[str]) -> List[List[float]]:
         """
-        Generate embeddings for multiple texts efficiently
+        Generate embeddings for multiple texts with one Redis round trip per direction
+        
+        Cached vectors are fetched with a single MGET; only the misses are
+        encoded (in one batch) and written back with one pipelined SETEX.
         
         Args:
             texts: List of texts to embed
             
         Returns:
-            List of embedding vectors
+            List of embedding vectors, in input order
         """
         if not texts:
             return []
         
+        # Load the model off the event loop if the warm-up has not finished yet
+        await model_registry.aget("embedding")
+        
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        pending: Dict[str, List[int]] = {}  # distinct non-empty text -> positions
+        for i, text in enumerate(texts):
+            if not text or not text.strip():
+                results[i] = [0.0] * self.dimension
+            else:
+                pending.setdefault(text, []).append(i)
+        
+        if not pending:
+            return results
+        
+        unique_texts = list(pending)
+        keys = [self._cache_key(text) for text in unique_texts]
+        
+        # 1. Resolve all cache keys in one round trip
+        try:
+            cached_values = await redis_binary_client.mget(keys)
+        except Exception as e:
+            logger.warning(f"Redis cache read failed: {str(e)}")
+            cached_values = [None] * len(keys)
+        
+        expected_size = encoded_size(self.dimension, self.cache_encoding)
+        misses = []
+        for text, cached in zip(unique_texts, cached_values):
+            if cached and len(cached) == expected_size:
+                embedding = decode_embedding(cached, self.cache_encoding).tolist()
+                for i in pending[text]:
+                    results[i] = embedding
+            else:
+                misses.append(text)
+        
+        logger.debug(f"Embedding cache: {len(unique_texts) - len(misses)} hits, {len(misses)} misses")
+        
+        if not misses:
+            return results
+        
+        # 2. Encode only the misses, micro-batched with other concurrent requests
         try:
-            embeddings = self.model.encode(texts, convert_to_numpy=True, show_progress_bar=False)
-            return [emb.tolist() for emb in embeddings]
+            embeddings = await self.batcher.submit(misses)
+            encoded = [emb.tolist() for emb in embeddings]
         except Exception as e:
             logger.error(f"Batch embedding generation failed: {str(e)}")
-            return [[0.0] * self.dimension for _ in texts]
+            # Zero vectors as fallback; never cached
+            for text in misses:
+                for i in pending[text]:
+                    results[i] = [0.0] * self.dimension
+            return results
+        
+        for text, embedding in zip(misses, encoded):
+            for i in pending[text]:
+                results[i] = embedding
+        
+        # 3. Write the new vectors back in one pipelined round trip
+        try:
+            async with redis_binary_client.pipeline(transaction=False) as pipe:
+                for text, embedding in zip(misses, embeddings):
+                    pipe.setex(self._cache_key(text), self.cache_ttl, encode_embedding(embedding, self.cache_encoding))
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Redis cache write failed: {str(e)}")
+        
+        return results
     
     def get_dimension(self) -> int:
         """Get the dimension of the embedding vectors"""
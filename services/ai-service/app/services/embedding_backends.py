@@ -0,0 +1,86 @@
+from typing import List, Dict, Optional
+import numpy as np
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+class SentenceTransformerBackend:
+    """Full-precision PyTorch inference (the fp32 baseline)"""
+
+    name = "torch"
+
+    def __init__(self, model_name: str, **kwargs):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device="cpu", **kwargs)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, convert_to_numpy=True, show_progress_bar=False)
+
+    def get_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+class QuantizedTorchBackend(SentenceTransformerBackend):
+    """PyTorch with Linear layers dynamically quantised to int8"""
+
+    name = "torch-int8"
+
+    def __init__(self, model_name: str, **kwargs):
+        super().__init__(model_name, **kwargs)
+        import torch
+
+        # In place, so the fp32 weights are not kept alongside the int8 copy
+        torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+class OnnxBackend(SentenceTransformerBackend):
+    """ONNX Runtime via sentence-transformers' onnx backend (needs optimum[onnxruntime])"""
+
+    name = "onnx"
+
+    def __init__(self, model_name: str, onnx_file: Optional[str] = None, **kwargs):
+        model_kwargs = {"file_name": onnx_file} if onnx_file else {}
+        super().__init__(model_name, backend="onnx", model_kwargs=model_kwargs, **kwargs)
+
+BACKENDS = {
+    SentenceTransformerBackend.name: SentenceTransformerBackend,
+    QuantizedTorchBackend.name: QuantizedTorchBackend,
+    OnnxBackend.name: OnnxBackend
+}
+
+def onnx_available() -> bool:
+    try:
+        import onnxruntime  # noqa: F401
+        import optimum  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def create_backend(name: str, model_name: str, onnx_file: Optional[str] = None) -> SentenceTransformerBackend:
+    """Build the configured backend, falling back to fp32 torch if it cannot load"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {name}")
+
+    if name == OnnxBackend.name:
+        if not onnx_available():
+            logger.warning("onnxruntime/optimum not installed, falling back to torch embedding backend")
+            return SentenceTransformerBackend(model_name)
+        try:
+            return OnnxBackend(model_name, onnx_file=onnx_file)
+        except Exception as e:
+            logger.warning(f"ONNX embedding backend failed to load ({str(e)}), falling back to torch")
+            return SentenceTransformerBackend(model_name)
+
+    return BACKENDS[name](model_name)
+
+def measure_drift(candidate: np.ndarray, baseline: np.ndarray) -> Dict[str, float]:
+    """Cosine similarity between candidate and fp32 baseline embeddings of the same texts"""
+    a = np.asarray(candidate, dtype=np.float32)
+    b = np.asarray(baseline, dtype=np.float32)
+    cosine = np.sum(a * b, axis=1) / np.maximum(
+        np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1), 1e-12
+    )
+    return {
+        "min_cosine": float(cosine.min()),
+        "mean_cosine": float(cosine.mean())
+    }
@@ -0,0 +1,42 @@
+import numpy as np
+
+# Supported cache encodings and their per-vector size for a given dimension
+ENCODINGS = ("float32", "float16", "int8")
+
+def encoded_size(dimension: int, encoding: str) -> int:
+    if encoding == "float32":
+        return 4 * dimension
+    if encoding == "float16":
+        return 2 * dimension
+    if encoding == "int8":
+        return 4 + dimension  # float32 scale + one byte per component
+    raise ValueError(f"Unknown embedding encoding: {encoding}")
+
+def encode_embedding(vector, encoding: str = "float32") -> bytes:
+    """
+    Serialise an embedding to raw little-endian bytes.
+
+    int8 uses symmetric per-vector quantisation: a float32 scale header
+    followed by round(v / scale) with scale = max(|v|) / 127.
+    """
+    vector = np.asarray(vector, dtype=np.float32)
+    if encoding == "float32":
+        return vector.astype("<f4").tobytes()
+    if encoding == "float16":
+        return vector.astype("<f2").tobytes()
+    if encoding == "int8":
+        scale = float(np.max(np.abs(vector))) / 127.0 if vector.size else 0.0
+        quantized = np.round(vector / scale) if scale > 0 else np.zeros_like(vector)
+        return np.float32(scale).astype("<f4").tobytes() + quantized.astype(np.int8).tobytes()
+    raise ValueError(f"Unknown embedding encoding: {encoding}")
+
+def decode_embedding(data: bytes, encoding: str = "float32") -> np.ndarray:
+    """Inverse of encode_embedding, always returning float32"""
+    if encoding == "float32":
+        return np.frombuffer(data, dtype="<f4").astype(np.float32)
+    if encoding == "float16":
+        return np.frombuffer(data, dtype="<f2").astype(np.float32)
+    if encoding == "int8":
+        scale = np.frombuffer(data[:4], dtype="<f4")[0]
+        return np.frombuffer(data[4:], dtype=np.int8).astype(np.float32) * scale
+    raise ValueError(f"Unknown embedding encoding: {encoding}")
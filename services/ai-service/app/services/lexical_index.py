@@ -0,0 +1,142 @@
+from typing import List, Dict, Tuple
+from collections import Counter
+from array import array
+import numpy as np
+import math
+import re
+
+TOKEN_PATTERN = re.compile(r"\w+(?:[-.+/^]\w+)*")
+
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from has have how in is it of on or that the "
+    "this to was what when where which who why will with".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase word tokens for BM25.
+
+    Compound tokens such as exam codes ("CS-101") or formulas ("H2O", "x^2")
+    are kept whole and also split into their parts, so both forms match.
+    """
+    tokens = []
+    for match in TOKEN_PATTERN.findall(text.lower()):
+        if match in STOP_WORDS:
+            continue
+        tokens.append(match)
+        if not match.isalnum():
+            tokens.extend(part for part in re.split(r"[-.+/^]", match) if part and part not in STOP_WORDS)
+    return tokens
+
+class LexicalIndex:
+    """
+    Incremental BM25 inverted index for one user/topic partition.
+
+    Postings are stored as compact typed arrays (row slot, term frequency);
+    deleted rows are masked and physically dropped once they exceed a
+    quarter of the slots.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # term -> (row slots, term frequencies)
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.doc_ids: List[str] = []
+        self.slots: Dict[str, int] = {}
+        self.doc_lengths = array("I")
+        self.alive = bytearray()
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self.slots
+
+    def add(self, ids: List[str], texts: List[str]):
+        existing = [item_id for item_id in ids if item_id in self.slots]
+        if existing:
+            self.remove(existing)
+
+        for item_id, text in zip(ids, texts):
+            tokens = tokenize(text)
+            slot = len(self.doc_ids)
+            for term, tf in Counter(tokens).items():
+                rows, tfs = self.postings.setdefault(term, (array("I"), array("H")))
+                rows.append(slot)
+                tfs.append(min(tf, 65535))
+
+            self.doc_ids.append(item_id)
+            self.slots[item_id] = slot
+            self.doc_lengths.append(len(tokens))
+            self.alive.append(1)
+            self.total_length += len(tokens)
+
+    def remove(self, ids: List[str]) -> int:
+        removed = 0
+        for item_id in ids:
+            slot = self.slots.pop(item_id, None)
+            if slot is None:
+                continue
+            self.alive[slot] = 0
+            self.total_length -= self.doc_lengths[slot]
+            removed += 1
+
+        if len(self.doc_ids) - len(self.slots) > max(64, len(self.doc_ids) // 4):
+            self._compact()
+        return removed
+
+    def _compact(self):
+        """Drop deleted rows and renumber slots densely"""
+        alive = np.frombuffer(self.alive, dtype=np.uint8).astype(bool)
+        remap = np.cumsum(alive) - 1
+
+        postings = {}
+        for term, (rows, tfs) in self.postings.items():
+            row_array = np.frombuffer(rows, dtype=np.uintc)
+            keep = alive[row_array]
+            if keep.any():
+                postings[term] = (
+                    array("I", remap[row_array[keep]].astype(np.uintc).tobytes()),
+                    array("H", np.frombuffer(tfs, dtype=np.ushort)[keep].tobytes())
+                )
+            del row_array
+
+        live_slots = np.flatnonzero(alive)
+        lengths = np.frombuffer(self.doc_lengths, dtype=np.uintc)[live_slots].tobytes()
+        self.doc_ids = [self.doc_ids[i] for i in live_slots]
+        self.slots = {item_id: i for i, item_id in enumerate(self.doc_ids)}
+        self.doc_lengths = array("I", lengths)
+        self.alive = bytearray(b"\x01" * len(self.doc_ids))
+        self.postings = postings
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """Top-k ids by BM25 score; ids without any query term are omitted"""
+        live = len(self.slots)
+        terms = set(tokenize(query))
+        if live == 0 or k <= 0 or not terms:
+            return []
+
+        lengths = np.frombuffer(self.doc_lengths, dtype=np.uintc).astype(np.float32)
+        avg_length = max(self.total_length / live, 1e-6)
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            rows = np.frombuffer(posting[0], dtype=np.uintc)
+            tfs = np.frombuffer(posting[1], dtype=np.ushort).astype(np.float32)
+            df = len(rows)
+            idf = math.log(1 + (live - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * lengths[rows] / avg_length)
+            # Each row appears once per posting list, so fancy-index add is safe
+            scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+        scores[np.frombuffer(self.alive, dtype=np.uint8) == 0] = 0
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) > k:
+            hits = hits[np.argpartition(scores[hits], -k)[-k:]]
+        hits = hits[np.argsort(scores[hits])[::-1]]
+        return [(self.doc_ids[i], float(scores[i])) for i in hits]
@@ -0,0 +1,81 @@
+from typing import Callable, List, Optional, Sequence, Tuple, Any
+from concurrent.futures import Executor, ThreadPoolExecutor
+import asyncio
+
+class MicroBatcher:
+    """
+    Coalesce items submitted by concurrent coroutines into batched calls.
+
+    Items are queued until `max_batch_size` are waiting or `max_wait_ms`
+    has passed since the first one arrived, then `fn(items)` runs once in a
+    worker thread and each caller's future receives its own result. If the
+    batch call raises, every caller in that batch gets the exception.
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        executor: Optional[Executor] = None
+    ):
+        self.fn = fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        # A single worker keeps batches from competing for the same cores
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="micro-batcher")
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def submit(self, items: List[Any]) -> List[Any]:
+        """Queue items and wait for their results (in input order)"""
+        if not items:
+            return []
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for item in items:
+            future = loop.create_future()
+            self._pending.append((item, future))
+            futures.append(future)
+            if len(self._pending) >= self.max_batch_size:
+                self._flush(loop)
+
+        if self._pending and self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush, loop)
+
+        return list(await asyncio.gather(*futures))
+
+    def _flush(self, loop: asyncio.AbstractEventLoop):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            # Skip callers that were cancelled while waiting
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            task = loop.run_in_executor(self.executor, self.fn, [item for item, _ in batch])
+            task.add_done_callback(lambda done, batch=batch: self._resolve(batch, done))
+
+    @staticmethod
+    def _resolve(batch: List[Tuple[Any, asyncio.Future]], done: asyncio.Future):
+        error = done.exception()
+        results = None if error else done.result()
+        if error is None and len(results) != len(batch):
+            error = RuntimeError(f"Batch function returned {len(results)} results for {len(batch)} items")
+
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results[i])
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
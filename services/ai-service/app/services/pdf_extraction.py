@@ -0,0 +1,172 @@
+from typing import AsyncIterator, Deque, Dict, List, Optional, Tuple, Union
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import io
+import multiprocessing
+import os
+import signal
+from app.core.config import get_settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+settings = get_settings()
+
+PdfSource = Union[bytes, str]
+
+def _open(source: PdfSource):
+    from pypdf import PdfReader
+
+    return PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+def _page_count(source: PdfSource) -> int:
+    return len(_open(source).pages)
+
+def _extract_pages(source: PdfSource, start: int, end: int) -> List[str]:
+    """Worker: text of pages [start, end). Each worker parses the file itself."""
+    reader = _open(source)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+def _register_worker(pids):
+    """Pool initializer: record the worker's pid so a stuck pool can be stopped"""
+    pids.put(os.getpid())
+
+class PdfExtractor:
+    """
+    PDF text extraction in a bounded process pool.
+
+    Parsing is CPU-bound pure Python, so it runs outside the event loop
+    (and the GIL). Documents are split into ranges of `pages_per_task`
+    pages, extracted in parallel with at most 2 * `max_workers` ranges in
+    flight, so page text held here is bounded by that window rather than
+    by the document.
+
+    A document that takes longer than `timeout` seconds fails with
+    TimeoutError and the pool is replaced, so a pathological file cannot
+    hold it. Other documents' ranges that were running on the stopped pool
+    are resubmitted to the new one (once) instead of failing with it.
+    """
+
+    def __init__(self, max_workers: int = 2, pages_per_task: int = 50, timeout: float = 120.0):
+        self.max_workers = max(1, max_workers)
+        self.pages_per_task = max(1, pages_per_task)
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._worker_pids: Dict[ProcessPoolExecutor, object] = {}
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: workers must not inherit the parent's threads or loaded models
+            context = multiprocessing.get_context("spawn")
+            pids = context.SimpleQueue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=context,
+                initializer=_register_worker,
+                initargs=(pids,)
+            )
+            self._worker_pids[self._executor] = pids
+        return self._executor
+
+    def _ranges(self, page_count: int) -> List[Tuple[int, int]]:
+        # Every task re-opens the document: pages_per_task trades that
+        # parsing overhead against the text buffered per range
+        size = self.pages_per_task
+        return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+    async def iter_pages(self, source: PdfSource) -> AsyncIterator[str]:
+        """
+        Yield page texts in order, a range at a time as workers finish
+
+        Pass a file path rather than bytes for large documents: workers
+        then open the file themselves, so the raw PDF never enters this
+        process. At most 2 * max_workers ranges are submitted at a time and
+        the next one only once the oldest has been handed over, so at most
+        that many ranges of page text are buffered here.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        timed_out = False
+        tasks: Deque[asyncio.Future] = deque()
+
+        async def run(fn, *args):
+            nonlocal timed_out
+            for attempt in range(2):
+                executor = self.executor
+                try:
+                    return await asyncio.wait_for(
+                        loop.run_in_executor(executor, fn, *args),
+                        max(0.0, deadline - loop.time())
+                    )
+                except asyncio.TimeoutError:
+                    if not timed_out:
+                        logger.error(f"PDF extraction timed out after {self.timeout}s")
+                    timed_out = True
+                    self._reset(executor)
+                    raise TimeoutError(f"PDF extraction exceeded {self.timeout}s")
+                except BrokenProcessPool:
+                    # Retry only if another document's timeout stopped the pool
+                    if timed_out or attempt or self._executor is executor:
+                        self._reset(executor)
+                        raise
+                    logger.warning("PDF worker pool was replaced mid-task; retrying the page range")
+
+        try:
+            page_count = await run(_page_count, source)
+            ranges = iter(self._ranges(page_count))
+
+            def submit():
+                for start, end in ranges:
+                    tasks.append(asyncio.ensure_future(run(_extract_pages, source, start, end)))
+                    return
+
+            for _ in range(2 * self.max_workers):
+                submit()
+            while tasks:
+                pages = await tasks.popleft()
+                # Refill before yielding so workers stay busy while the consumer runs
+                submit()
+                for page in pages:
+                    yield page
+        finally:
+            # Consumer stopped early or a range failed: drop queued ranges
+            for task in tasks:
+                task.cancel()
+
+    async def extract(self, source: PdfSource) -> str:
+        """
+        Full document text. Callers that need the whole text hold it all;
+        use iter_pages() to keep memory to the in-flight window.
+        """
+        return '\n\n'.join([page async for page in self.iter_pages(source)])
+
+    def _reset(self, executor: ProcessPoolExecutor):
+        """Drop a pool whose workers may be stuck on a timed-out document"""
+        if self._executor is executor:
+            self._executor = None
+        pids = self._worker_pids.pop(executor, None)
+        executor.shutdown(wait=False, cancel_futures=True)
+        if pids is None:
+            return
+        # Running tasks cannot be cancelled; stop their processes instead
+        while not pids.empty():
+            try:
+                os.kill(pids.get(), signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        pids.close()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._worker_pids.pop(self._executor, None)
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Global instance
+pdf_extractor = PdfExtractor(
+    max_workers=settings.PDF_EXTRACT_WORKERS,
+    pages_per_task=settings.PDF_PAGES_PER_TASK,
+    timeout=settings.PDF_EXTRACT_TIMEOUT_SECONDS
+)
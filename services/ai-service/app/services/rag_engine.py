@@ -1,21 +1,227 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Optional
 from app.services.embedding import embedding_service
-from app.core.gemini_client import get_gemini_client
+from app.services.vector_index import VectorIndex
+from app.core.gemini_client import expect_type, get_gemini_client
+from app.core.models import model_registry
+from app.core.config import get_settings
 from app.core.logging import get_logger
+import asyncio
 import numpy as np
+import uuid
 
 logger = get_logger(__name__)
+settings = get_settings()
+
+ANSWER_FALLBACK = "I'm having trouble generating an answer right now. Please try again."
+
+def _strings(value: Any, limit: int) -> List[str]:
+    """The non-empty strings of a JSON list reply, at most `limit` ([] if it is not a list)"""
+    if not isinstance(value, list):
+        return []
+    return [item.strip() for item in value if isinstance(item, str) and item.strip()][:limit]
 
 class RagEngine:
     """Retrieval-Augmented Generation engine using real embeddings and Gemini"""
     
-    def __init__(self):
+    def __init__(self, chunk_size: int = 200, chunk_overlap: int = 40):
         self.gemini = get_gemini_client()
+        self._index: Optional[VectorIndex] = None
+        self.chunk_size = chunk_size  # words per chunk
+        self.chunk_overlap = chunk_overlap
+    
+    @property
+    def index(self) -> VectorIndex:
+        # Created on first use: the dimension comes from the (lazily loaded) embedding model
+        if self._index is None:
+            self._index = VectorIndex(
+                embedding_service.get_dimension(),
+                backend=settings.RAG_INDEX_BACKEND,
+                store_path=settings.RAG_INDEX_PATH,
+                lexical=settings.RAG_RETRIEVAL_MODE == "hybrid",
+                **self._ann_params()
+            )
+        return self._index
+    
+    async def _get_index(self) -> VectorIndex:
+        """The index, loading the embedding model (for its dimension) off the event loop first"""
+        if self._index is None:
+            await model_registry.aget("embedding")
+        return self.index
+    
+    def _ann_params(self) -> Dict[str, Any]:
+        if settings.RAG_INDEX_BACKEND != "ivf":
+            return {}
+        return {
+            "nlist": settings.RAG_IVF_NLIST,
+            "nprobe": settings.RAG_IVF_NPROBE,
+            "min_train_size": settings.RAG_IVF_MIN_TRAIN_SIZE
+        }
+    
+    async def add_document(
+        self,
+        user_id: str,
+        topic_id: str,
+        content: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        document_id: Optional[str] = None
+    ) -> str:
+        """
+        Chunk, embed and index a document for retrieval
+        
+        Args:
+            user_id: Owner of the document
+            topic_id: Topic the document belongs to
+            content: Full document text
+            metadata: Extra metadata stored with every chunk
+            document_id: Reuse an id to re-index an existing document
+            
+        Returns:
+            Document id
+        """
+        chunks = self.chunk_text(content)
+        if not chunks:
+            raise ValueError("Document content is empty")
+        
+        embeddings = await embedding_service.generate_batch_embeddings(chunks)
+        return await self.add_chunks(user_id, topic_id, chunks, embeddings, metadata, document_id)
+    
+    async def add_chunks(
+        self,
+        user_id: str,
+        topic_id: str,
+        chunks: List[str],
+        embeddings: List[List[float]],
+        metadata: Optional[Dict[str, Any]] = None,
+        document_id: Optional[str] = None
+    ) -> str:
+        """Index chunks that were already embedded (e.g. by DocumentProcessor)"""
+        document_id = document_id or str(uuid.uuid4())
+        # Index writes can block (IVF training, segment fsyncs): keep them off the event loop
+        index = await self._get_index()
+        await asyncio.to_thread(index.add_document, user_id, topic_id, document_id, chunks, embeddings, metadata)
+        
+        logger.info(f"Indexed document {document_id} ({len(chunks)} chunks) for user {user_id}")
+        return document_id
+    
+    async def remove_document(self, document_id: str) -> bool:
+        """Remove a document and all its chunks from the index"""
+        index = await self._get_index()
+        return await asyncio.to_thread(index.remove_document, document_id) > 0
+    
+    async def query(
+        self,
+        query: str,
+        user_id: str,
+        topic_id: Optional[str] = None,
+        max_results: int = 5
+    ) -> Dict[str, Any]:
+        """
+        Answer a query from the user's indexed documents
+        
+        Args:
+            query: User's question
+            user_id: Whose documents to search
+            topic_id: Optionally restrict retrieval to one topic
+            max_results: Number of sources to return
+            
+        Returns:
+            Answer, ranked sources and a retrieval confidence
+        """
+        hits = await self._retrieve(query, user_id, topic_id, max_results)
+        if not hits:
+            return {
+                "answer": "I could not find relevant information.",
+                "sources": [],
+                "confidence": 0.0
+            }
+        
+        context_text = "\n\n---\n\n".join(hit["content"] for hit in hits[:3])
+        answer_text = await self._generate_answer(query, context_text)
+        
+        return {"answer": answer_text, **self._sources(hits)}
+    
+    async def query_stream(
+        self,
+        query: str,
+        user_id: str,
+        topic_id: Optional[str] = None,
+        max_results: int = 5
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of query()
+        
+        Yields:
+            {"type": "sources", "sources": [...], "confidence": ...} once retrieval is done,
+            {"type": "delta", "text": ...} answer chunks, then {"type": "done", "answer": ...}
+        """
+        hits = await self._retrieve(query, user_id, topic_id, max_results)
+        if not hits:
+            yield {"type": "sources", "sources": [], "confidence": 0.0}
+            yield {"type": "done", "answer": "I could not find relevant information."}
+            return
+        
+        yield {"type": "sources", **self._sources(hits)}
+        
+        context_text = "\n\n---\n\n".join(hit["content"] for hit in hits[:3])
+        parts = []
+        async for text in self._stream_answer(query, context_text):
+            parts.append(text)
+            yield {"type": "delta", "text": text}
+        
+        yield {"type": "done", "answer": "".join(parts)}
+    
+    async def _retrieve(
+        self,
+        query: str,
+        user_id: str,
+        topic_id: Optional[str],
+        max_results: int
+    ) -> List[Dict[str, Any]]:
+        query_embedding = await embedding_service.generate_embedding(query)
+        index = await self._get_index()
+        return await asyncio.to_thread(
+            index.hybrid_search,
+            user_id,
+            query,
+            query_embedding,
+            max_results,
+            topic_id,
+            candidates=settings.RAG_HYBRID_CANDIDATES,
+            prefilter_min_size=settings.RAG_LEXICAL_PREFILTER_MIN_SIZE
+        )
+    
+    def _sources(self, hits: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "sources": [
+                {
+                    "content": hit["content"],
+                    "relevance": hit["relevance"],
+                    "metadata": hit["metadata"]
+                }
+                for hit in hits
+            ],
+            "confidence": max(0.0, min(1.0, hits[0]["relevance"]))
+        }
+    
+    def chunk_text(self, text: str) -> List[str]:
+        """Split text into overlapping word windows sized for the embedding model"""
+        words = text.split()
+        if not words:
+            return []
+        
+        step = max(1, self.chunk_size - self.chunk_overlap)
+        chunks = []
+        for start in range(0, len(words), step):
+            chunks.append(" ".join(words[start:start + self.chunk_size]))
+            if start + self.chunk_size >= len(words):
+                break
+        return chunks
     
     async def answer_query(
         self, 
         query: str, 
-        context_chunks: List[str]
+        context_chunks: List[str],
+        include_follow_up: bool = True
     ) -> Dict[str, Any]:
         """
         Answer a query using RAG with real AI
@@ -23,6 +229,8 @@ class RagEngine:
         Args:
             query: User's question
             context_chunks: Retrieved context from documents
+            include_follow_up: Generate suggested follow-up questions (one
+                more Gemini round trip after the answer)
             
         Returns:
             Answer with related topics and suggested questions
@@ -42,8 +250,116 @@ class RagEngine:
         top_chunks = ranked_chunks[:3]
         context_text = "\n\n---\n\n".join(top_chunks)
         
-        # 3. Generate answer using Gemini
-        prompt = f"""You are a helpful tutor answering a student's question based on their study material.
+        # 3. Extract related topics from context, alongside the answer
+        topics_task = asyncio.create_task(self._extract_topics(context_text))
+        try:
+            # 4. Generate answer using Gemini
+            answer_text = await self._generate_answer(query, context_text)
+            
+            # 5. Generate follow-up questions (needs the answer)
+            follow_up = []
+            if include_follow_up:
+                follow_up = await self._generate_follow_up(query, answer_text)
+            
+            related_topics = await topics_task
+        finally:
+            topics_task.cancel()
+        
+        return {
+            "answer": answer_text,
+            "related_topics": related_topics,
+            "suggested_questions": follow_up,
+            "sources_used": len(top_chunks)
+        }
+    
+    async def answer_query_stream(
+        self, 
+        query: str, 
+        context_chunks: List[str],
+        include_follow_up: bool = True
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of answer_query()
+        
+        Yields:
+            {"type": "delta", "text": ...} answer chunks; an "answer" event with
+            the full answer and related topics as soon as the answer is complete;
+            a "follow_up" event with suggested questions (unless skipped); then
+            a "done" event with everything
+        """
+        
+        if not context_chunks:
+            yield {
+                "type": "done",
+                "answer": "I don't have enough context to answer this question.",
+                "related_topics": [],
+                "suggested_questions": []
+            }
+            return
+        
+        ranked_chunks = await self._rank_chunks(query, context_chunks)
+        top_chunks = ranked_chunks[:3]
+        context_text = "\n\n---\n\n".join(top_chunks)
+        
+        topics_task = asyncio.create_task(self._extract_topics(context_text))
+        try:
+            parts = []
+            async for text in self._stream_answer(query, context_text):
+                parts.append(text)
+                yield {"type": "delta", "text": text}
+            answer_text = "".join(parts)
+            
+            related_topics = await topics_task
+            yield {
+                "type": "answer",
+                "answer": answer_text,
+                "related_topics": related_topics,
+                "sources_used": len(top_chunks)
+            }
+            
+            follow_up = []
+            if include_follow_up:
+                follow_up = await self._generate_follow_up(query, answer_text)
+                yield {"type": "follow_up", "suggested_questions": follow_up}
+        finally:
+            # Client went away mid-stream: don't leave topic extraction running
+            topics_task.cancel()
+        
+        yield {
+            "type": "done",
+            "answer": answer_text,
+            "related_topics": related_topics,
+            "suggested_questions": follow_up,
+            "sources_used": len(top_chunks)
+        }
+    
+    async def _generate_answer(self, query: str, context_text: str) -> str:
+        """Generate an answer grounded in the given context"""
+        
+        try:
+            answer_text = await self.gemini.generate(self._answer_prompt(query, context_text))
+        except Exception as e:
+            logger.error(f"Answer generation failed: {str(e)}")
+            answer_text = ANSWER_FALLBACK
+        
+        return answer_text
+    
+    async def _stream_answer(self, query: str, context_text: str) -> AsyncIterator[str]:
+        """Stream an answer grounded in the given context"""
+        
+        started = False
+        try:
+            async for text in self.gemini.generate_stream(self._answer_prompt(query, context_text)):
+                started = True
+                yield text
+        except Exception as e:
+            logger.error(f"Answer streaming failed: {str(e)}")
+            # Partial output is kept; only an answer that never started is replaced
+            if not started:
+                yield ANSWER_FALLBACK
+    
+    def _answer_prompt(self, query: str, context_text: str) -> str:
+        return f"""You are a helpful tutor answering a student's question based on their study material.
 
 Context from documents:
 {context_text}
@@ -57,25 +373,6 @@ Instructions:
 4. Use examples from the context when helpful
 
 Answer:"""
-        
-        try:
-            answer_text = await self.gemini.generate(prompt)
-        except Exception as e:
-            logger.error(f"Answer generation failed: {str(e)}")
-            answer_text = "I'm having trouble generating an answer right now. Please try again."
-        
-        # 4. Extract related topics from context
-        related_topics = await self._extract_topics(context_text)
-        
-        # 5. Generate follow-up questions
-        follow_up = await self._generate_follow_up(query, answer_text)
-        
-        return {
-            "answer": answer_text,
-            "related_topics": related_topics,
-            "suggested_questions": follow_up,
-            "sources_used": len(top_chunks)
-        }
     
     async def _rank_chunks(
         self, 
@@ -88,20 +385,15 @@ Answer:"""
             return chunks
         
         try:
-            # Generate embeddings
-            query_embedding = embedding_service.generate_embedding(query)
-            chunk_embeddings = embedding_service.generate_batch_embeddings(chunks)
+            # Query and chunks share one cache lookup and one encode batch
+            embeddings = await embedding_service.generate_batch_embeddings([query] + chunks)
+            query_embedding, chunk_embeddings = embeddings[0], embeddings[1:]
             
-            # Calculate cosine similarities
-            query_vec = np.array(query_embedding)
-            similarities = []
-            
-            for chunk_emb in chunk_embeddings:
-                chunk_vec = np.array(chunk_emb)
-                similarity = np.dot(query_vec, chunk_vec) / (
-                    np.linalg.norm(query_vec) * np.linalg.norm(chunk_vec)
-                )
-                similarities.append(similarity)
+            # Cosine similarity for all chunks in one matrix-vector product
+            query_vec = np.asarray(query_embedding, dtype=np.float32)
+            chunk_matrix = np.asarray(chunk_embeddings, dtype=np.float32)
+            norms = np.linalg.norm(chunk_matrix, axis=1) * np.linalg.norm(query_vec)
+            similarities = (chunk_matrix @ query_vec) / np.maximum(norms, 1e-12)
             
             # Sort chunks by similarity (descending)
             ranked_indices = np.argsort(similarities)[::-1]
@@ -121,10 +413,8 @@ Text:
 """
         
         try:
-            topics = await self.gemini.generate_json(prompt)
-            if isinstance(topics, list):
-                return topics[:5]
-            return []
+            topics = await self.gemini.generate_json(prompt, validate=expect_type(list))
+            return _strings(topics, 5)
         except Exception as e:
             logger.error(f"Topic extraction failed: {str(e)}")
             return []
@@ -144,10 +434,8 @@ Answer given: {answer[:500]}
 """
         
         try:
-            questions = await self.gemini.generate_json(prompt)
-            if isinstance(questions, list):
-                return questions[:3]
-            return []
+            questions = await self.gemini.generate_json(prompt, validate=expect_type(list))
+            return _strings(questions, 3)
         except Exception as e:
             logger.error(f"Follow-up generation failed: {str(e)}")
             return [
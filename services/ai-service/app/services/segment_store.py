@@ -0,0 +1,316 @@
+from typing import List, Dict, Any, Optional, Tuple
+from urllib.parse import quote, unquote
+from contextlib import contextmanager
+import numpy as np
+import fcntl
+import json
+import os
+import uuid
+
+class SegmentStore:
+    """
+    On-disk embedding store made of immutable float32 segment files.
+
+    Layout under `root`:
+        partitions/{user}/{topic}/MANIFEST.json   segment list + tombstones
+        partitions/{user}/{topic}/{segment}.f32   raw little-endian float32 rows
+        partitions/{user}/{topic}/{segment}.ids   JSON list of row ids
+        documents/{document}.json                 chunk texts and metadata
+
+    Segments are opened with np.memmap, so every worker process on a node
+    shares the same page cache. Writers serialise on a per-partition flock
+    and publish by atomically replacing the manifest.
+    """
+
+    def __init__(self, root: str, dimension: int, max_segments: int = 8):
+        self.root = root
+        self.dimension = dimension
+        self.max_segments = max_segments
+        os.makedirs(os.path.join(root, "partitions"), exist_ok=True)
+        os.makedirs(os.path.join(root, "documents"), exist_ok=True)
+
+    @staticmethod
+    def _encode(value: str) -> str:
+        return quote(value, safe="").replace(".", "%2E")
+
+    def _partition_dir(self, user_id: str, topic_id: str) -> str:
+        return os.path.join(self.root, "partitions", self._encode(user_id), self._encode(topic_id))
+
+    def _write_atomic(self, path: str, data: bytes):
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @contextmanager
+    def _locked(self, user_id: str, topic_id: str):
+        directory = self._partition_dir(user_id, topic_id)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "LOCK"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield directory
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def user_topics(self, user_id: str) -> List[str]:
+        """Topic ids with a persisted partition for this user"""
+        user_dir = os.path.join(self.root, "partitions", self._encode(user_id))
+        if not os.path.isdir(user_dir):
+            return []
+        return [unquote(name) for name in os.listdir(user_dir)]
+
+    def manifest_stamp(self, user_id: str, topic_id: str) -> Optional[Tuple[int, int]]:
+        """Cheap change marker for the partition manifest (inode, mtime)"""
+        try:
+            st = os.stat(os.path.join(self._partition_dir(user_id, topic_id), "MANIFEST.json"))
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns)
+
+    def read_manifest(self, user_id: str, topic_id: str) -> Dict[str, Any]:
+        path = os.path.join(self._partition_dir(user_id, topic_id), "MANIFEST.json")
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"segments": [], "sizes": {}, "tombstones": {}}
+
+    def _write_manifest(self, directory: str, manifest: Dict[str, Any]):
+        self._write_atomic(os.path.join(directory, "MANIFEST.json"), json.dumps(manifest).encode("utf-8"))
+
+    def open_segment(self, user_id: str, topic_id: str, segment: str) -> Tuple[np.ndarray, List[str]]:
+        """Map a segment read-only and return (vectors, ids)"""
+        directory = self._partition_dir(user_id, topic_id)
+        with open(os.path.join(directory, f"{segment}.ids")) as f:
+            ids = json.load(f)
+        vectors = np.memmap(
+            os.path.join(directory, f"{segment}.f32"),
+            dtype="<f4",
+            mode="r",
+            shape=(len(ids), self.dimension)
+        )
+        return vectors, ids
+
+    def _write_segment(self, directory: str, ids: List[str], vectors: np.ndarray) -> str:
+        segment = uuid.uuid4().hex
+        data = np.ascontiguousarray(vectors, dtype="<f4")
+        # Vectors first: a segment only becomes visible once listed in the manifest
+        self._write_atomic(os.path.join(directory, f"{segment}.f32"), data.tobytes())
+        self._write_atomic(os.path.join(directory, f"{segment}.ids"), json.dumps(ids).encode("utf-8"))
+        return segment
+
+    def append_segment(self, user_id: str, topic_id: str, ids: List[str], vectors: np.ndarray) -> str:
+        """Persist rows as a new segment, compacting when too many accumulate"""
+        with self._locked(user_id, topic_id) as directory:
+            manifest = self.read_manifest(user_id, topic_id)
+            segment = self._write_segment(directory, ids, vectors)
+            manifest["segments"].append(segment)
+            manifest.setdefault("sizes", {})[segment] = len(ids)
+            self._write_manifest(directory, manifest)
+
+            if len(manifest["segments"]) > self.max_segments:
+                self._compact(user_id, topic_id, directory, manifest)
+        return segment
+
+    def add_tombstones(self, user_id: str, topic_id: str, deleted: Dict[str, List[str]]):
+        """Mark ids (grouped by segment) as deleted"""
+        with self._locked(user_id, topic_id) as directory:
+            manifest = self.read_manifest(user_id, topic_id)
+            tombstones = manifest.setdefault("tombstones", {})
+            for segment, ids in deleted.items():
+                if segment in manifest["segments"]:
+                    tombstones[segment] = sorted(set(tombstones.get(segment, [])) | set(ids))
+            self._write_manifest(directory, manifest)
+
+            total = sum(manifest.get("sizes", {}).values())
+            dead = sum(len(ids) for ids in tombstones.values())
+            if total and dead / total > 0.25:
+                self._compact(user_id, topic_id, directory, manifest)
+
+    def compact(self, user_id: str, topic_id: str):
+        """Rewrite all live rows of a partition into a single segment"""
+        with self._locked(user_id, topic_id) as directory:
+            self._compact(user_id, topic_id, directory, self.read_manifest(user_id, topic_id))
+
+    def _compact(self, user_id: str, topic_id: str, directory: str, manifest: Dict[str, Any]):
+        tombstones = manifest.get("tombstones", {})
+        live_ids: List[str] = []
+        live_vectors: List[np.ndarray] = []
+        for segment in manifest["segments"]:
+            vectors, ids = self.open_segment(user_id, topic_id, segment)
+            dead = set(tombstones.get(segment, []))
+            keep = [i for i, item_id in enumerate(ids) if item_id not in dead]
+            live_ids.extend(ids[i] for i in keep)
+            live_vectors.append(np.asarray(vectors[keep]))
+
+        old_segments = manifest["segments"]
+        segments, sizes = [], {}
+        if live_ids:
+            segment = self._write_segment(directory, live_ids, np.concatenate(live_vectors))
+            segments.append(segment)
+            sizes[segment] = len(live_ids)
+        self._write_manifest(directory, {"segments": segments, "sizes": sizes, "tombstones": {}})
+
+        # Readers that still map the old files keep valid views until they refresh
+        for segment in old_segments:
+            for suffix in (".f32", ".ids"):
+                try:
+                    os.remove(os.path.join(directory, segment + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def _document_path(self, document_id: str) -> str:
+        return os.path.join(self.root, "documents", f"{self._encode(document_id)}.json")
+
+    def write_document(self, document_id: str, record: Dict[str, Any]):
+        self._write_atomic(self._document_path(document_id), json.dumps(record).encode("utf-8"))
+
+    def document_stamp(self, document_id: str) -> Optional[Tuple[int, int]]:
+        """Change marker for a document record (inode, mtime); None once deleted"""
+        try:
+            st = os.stat(self._document_path(document_id))
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns)
+
+    def read_document(self, document_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._document_path(document_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def delete_document(self, document_id: str):
+        try:
+            os.remove(self._document_path(document_id))
+        except FileNotFoundError:
+            pass
+
+class MappedSegment:
+    """A read-only memory-mapped segment plus its live-row mask"""
+
+    def __init__(self, name: str, vectors: np.ndarray, ids: List[str]):
+        self.name = name
+        self.vectors = vectors
+        self.ids = ids
+        self.alive = np.ones(len(ids), dtype=bool)
+
+class MmapPartition:
+    """
+    Exact-search partition backed by SegmentStore files.
+
+    Rows are never copied into process memory; each search is one
+    matrix-vector product per segment (compaction keeps the count small).
+    Changes made by other workers are picked up when the manifest changes.
+    """
+
+    def __init__(self, dimension: int, store: SegmentStore, user_id: str, topic_id: str, **kwargs):
+        self.dimension = dimension
+        self.store = store
+        self.user_id = user_id
+        self.topic_id = topic_id
+        self.segments: List[MappedSegment] = []
+        self.positions: Dict[str, Tuple[int, int]] = {}
+        self._stamp: Optional[Tuple[int, int]] = None
+        self.version = 0  # bumped whenever the live row set is reloaded
+        self.refresh()
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self.positions)
+
+    def refresh(self, attempts: int = 3):
+        """Re-read the manifest if another writer has published changes"""
+        stamp = self.store.manifest_stamp(self.user_id, self.topic_id)
+        if stamp == self._stamp:
+            return
+
+        manifest = self.store.read_manifest(self.user_id, self.topic_id)
+        opened = {segment.name: segment for segment in self.segments}
+        tombstones = manifest.get("tombstones", {})
+
+        segments = []
+        for name in manifest["segments"]:
+            segment = opened.get(name)
+            if segment is None:
+                try:
+                    segment = MappedSegment(name, *self.store.open_segment(self.user_id, self.topic_id, name))
+                except FileNotFoundError:
+                    # A concurrent compaction replaced the manifest we just read
+                    if attempts > 1:
+                        return self.refresh(attempts - 1)
+                    raise
+            dead = set(tombstones.get(name, []))
+            segment.alive = np.fromiter((item_id not in dead for item_id in segment.ids), dtype=bool, count=len(segment.ids))
+            segments.append(segment)
+
+        positions = {}
+        for s, segment in enumerate(segments):
+            for row in np.flatnonzero(segment.alive):
+                positions[segment.ids[row]] = (s, int(row))
+
+        self.segments = segments
+        self.positions = positions
+        self._stamp = stamp
+        self.version += 1
+
+    def add(self, ids: List[str], vectors: np.ndarray):
+        """Persist rows as a new segment; re-added ids supersede older rows"""
+        self.refresh()
+        existing = [item_id for item_id in ids if item_id in self.positions]
+        if existing:
+            self.remove(existing)
+        self.store.append_segment(self.user_id, self.topic_id, list(ids), vectors)
+        self.refresh()
+
+    def remove(self, ids: List[str]) -> int:
+        self.refresh()
+        deleted: Dict[str, List[str]] = {}
+        for item_id in ids:
+            position = self.positions.get(item_id)
+            if position is not None:
+                deleted.setdefault(self.segments[position[0]].name, []).append(item_id)
+        if not deleted:
+            return 0
+
+        self.store.add_tombstones(self.user_id, self.topic_id, deleted)
+        self.refresh()
+        return sum(len(v) for v in deleted.values())
+
+    def score_ids(self, query: np.ndarray, ids: List[str]) -> List[Tuple[str, float]]:
+        """Cosine scores for a candidate subset, grouped into one gather per segment"""
+        self.refresh()
+        by_segment: Dict[int, List[int]] = {}
+        for item_id in ids:
+            position = self.positions.get(item_id)
+            if position is not None:
+                by_segment.setdefault(position[0], []).append(position[1])
+
+        results = []
+        for s, rows in by_segment.items():
+            segment = self.segments[s]
+            scores = np.asarray(segment.vectors[rows]) @ query
+            results.extend((segment.ids[row], float(score)) for row, score in zip(rows, scores))
+        return results
+
+    def search(self, query: np.ndarray, k: int, **kwargs) -> List[Tuple[str, float]]:
+        """Top-k over all live rows, one matrix-vector product per segment"""
+        self.refresh()
+        if k <= 0:
+            return []
+
+        candidates: List[Tuple[str, float]] = []
+        for segment in self.segments:
+            if not segment.alive.any():
+                continue
+            scores = np.asarray(segment.vectors @ query)
+            scores[~segment.alive] = -np.inf
+            top_n = min(k, int(segment.alive.sum()))
+            top = np.argpartition(scores, -top_n)[-top_n:]
+            candidates.extend((segment.ids[i], float(scores[i])) for i in top)
+
+        candidates.sort(key=lambda hit: hit[1], reverse=True)
+        return candidates[:k]
@@ -0,0 +1,613 @@
+from typing import List, Dict, Any, Optional, Tuple
+from app.services.segment_store import SegmentStore, MmapPartition
+from app.services.lexical_index import LexicalIndex
+import numpy as np
+import threading
+
+class IndexPartition:
+    """Contiguous float32 embedding storage for a single user/topic partition"""
+
+    def __init__(self, dimension: int, initial_capacity: int = 256):
+        self.dimension = dimension
+        self.vectors = np.zeros((initial_capacity, dimension), dtype=np.float32)
+        self.ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _ensure_capacity(self, required: int):
+        """Grow the backing array geometrically so inserts stay amortised O(1)"""
+        capacity = self.vectors.shape[0]
+        if required <= capacity:
+            return
+
+        new_capacity = max(required, capacity * 2)
+        grown = np.zeros((new_capacity, self.dimension), dtype=np.float32)
+        grown[:len(self.ids)] = self.vectors[:len(self.ids)]
+        self.vectors = grown
+
+    def add(self, ids: List[str], vectors: np.ndarray):
+        """Append normalised vectors; existing ids are overwritten in place"""
+        new_rows = []
+        for row, item_id in enumerate(ids):
+            position = self.positions.get(item_id)
+            if position is not None:
+                self.vectors[position] = vectors[row]
+            else:
+                new_rows.append(row)
+
+        if not new_rows:
+            return
+
+        start = len(self.ids)
+        self._ensure_capacity(start + len(new_rows))
+        self.vectors[start:start + len(new_rows)] = vectors[new_rows]
+        for offset, row in enumerate(new_rows):
+            self.ids.append(ids[row])
+            self.positions[ids[row]] = start + offset
+
+    def _move_row(self, source: int, target: int):
+        self.vectors[target] = self.vectors[source]
+
+    def remove(self, ids: List[str]) -> int:
+        """Delete ids by moving the last row into the freed slot"""
+        removed = 0
+        for item_id in ids:
+            position = self.positions.pop(item_id, None)
+            if position is None:
+                continue
+
+            last = len(self.ids) - 1
+            if position != last:
+                moved_id = self.ids[last]
+                self._move_row(last, position)
+                self.ids[position] = moved_id
+                self.positions[moved_id] = position
+            self.ids.pop()
+            removed += 1
+        return removed
+
+    def search(self, query: np.ndarray, k: int, **kwargs) -> List[Tuple[str, float]]:
+        """Top-k by cosine similarity using a single matrix-vector product"""
+        count = len(self.ids)
+        if count == 0 or k <= 0:
+            return []
+
+        scores = self.vectors[:count] @ query
+        return self._top_k(np.arange(count), scores, k)
+
+    def score_ids(self, query: np.ndarray, ids: List[str]) -> List[Tuple[str, float]]:
+        """Cosine scores for a candidate subset (e.g. a lexical prefilter)"""
+        rows = np.array([self.positions[i] for i in ids if i in self.positions], dtype=np.int64)
+        if len(rows) == 0:
+            return []
+        scores = self.vectors[rows] @ query
+        return [(self.ids[row], float(score)) for row, score in zip(rows, scores)]
+
+    def _top_k(self, rows: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        if k < len(rows):
+            top = np.argpartition(scores, -k)[-k:]
+        else:
+            top = np.arange(len(rows))
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(self.ids[rows[i]], float(scores[i])) for i in top]
+
+class IVFPartition(IndexPartition):
+    """
+    Inverted-file partition for approximate search on large partitions.
+
+    Vectors are clustered with spherical k-means; a query only scores the
+    rows assigned to its `nprobe` closest centroids. Until the partition
+    reaches `min_train_size` it behaves exactly like IndexPartition.
+    """
+
+    def __init__(
+        self,
+        dimension: int,
+        nlist: Optional[int] = None,
+        nprobe: int = 16,
+        min_train_size: int = 20000,
+        kmeans_iterations: int = 10,
+        initial_capacity: int = 256
+    ):
+        super().__init__(dimension, initial_capacity)
+        self.nlist = nlist  # None = 4 * sqrt(n) at training time
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.kmeans_iterations = kmeans_iterations
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments = np.zeros(initial_capacity, dtype=np.int32)
+        self._trained_size = 0
+        self._rng = np.random.default_rng(0)
+
+    def _ensure_capacity(self, required: int):
+        super()._ensure_capacity(required)
+        if self.vectors.shape[0] > self.assignments.shape[0]:
+            grown = np.zeros(self.vectors.shape[0], dtype=np.int32)
+            grown[:len(self.ids)] = self.assignments[:len(self.ids)]
+            self.assignments = grown
+
+    def _move_row(self, source: int, target: int):
+        super()._move_row(source, target)
+        self.assignments[target] = self.assignments[source]
+
+    def _assign(self, start: int, end: int, block: int = 8192):
+        for i in range(start, end, block):
+            j = min(i + block, end)
+            self.assignments[i:j] = np.argmax(self.vectors[i:j] @ self.centroids.T, axis=1)
+
+    def train(self):
+        """Fit centroids on a sample of the partition and reassign every row"""
+        count = len(self.ids)
+        nlist = self.nlist or int(4 * np.sqrt(count))
+        nlist = max(1, min(nlist, count))
+
+        sample_size = min(count, nlist * 32)
+        sample = self.vectors[self._rng.choice(count, sample_size, replace=False)]
+        centroids = sample[self._rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(self.kmeans_iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sizes = np.bincount(labels, minlength=nlist)
+
+            # Per-cluster sums via one sort + reduceat (np.add.at is far slower)
+            order = np.argsort(labels, kind="stable")
+            nonempty = np.flatnonzero(sizes)
+            starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))[nonempty]
+            sums = np.zeros_like(centroids)
+            sums[nonempty] = np.add.reduceat(sample[order], starts, axis=0)
+
+            empty = sizes == 0
+            if empty.any():
+                # Re-seed empty lists from random sample rows
+                sums[empty] = sample[self._rng.choice(sample_size, int(empty.sum()))]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+        self.centroids = centroids.astype(np.float32)
+        self._assign(0, count)
+        self._trained_size = count
+
+    def add(self, ids: List[str], vectors: np.ndarray):
+        start = len(self.ids)
+        super().add(ids, vectors)
+
+        count = len(self.ids)
+        if count >= self.min_train_size and count >= 2 * self._trained_size:
+            # Retrain as the partition doubles so lists stay balanced
+            self.train()
+        elif self.centroids is not None:
+            self._assign(start, count)
+            # Overwritten ids keep their row; refresh their list too
+            for item_id in ids:
+                position = self.positions[item_id]
+                if position < start:
+                    self._assign(position, position + 1)
+
+    def search(self, query: np.ndarray, k: int, nprobe: Optional[int] = None, **kwargs) -> List[Tuple[str, float]]:
+        """Approximate top-k over the rows of the closest inverted lists"""
+        if self.centroids is None:
+            return super().search(query, k)
+
+        count = len(self.ids)
+        if count == 0 or k <= 0:
+            return []
+
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        centroid_scores = self.centroids @ query
+        probes = np.argpartition(centroid_scores, -nprobe)[-nprobe:]
+
+        probe_mask = np.zeros(len(self.centroids), dtype=bool)
+        probe_mask[probes] = True
+        rows = np.flatnonzero(probe_mask[self.assignments[:count]])
+        scores = self.vectors[rows] @ query
+        return self._top_k(rows, scores, k)
+
+class VectorIndex:
+    """
+    Vector index partitioned by user and topic.
+
+    `backend` selects the search strategy for every partition of this index:
+    "exact" scores all rows, "ivf" uses IVFPartition (tuned with `nlist`,
+    `nprobe` and `min_train_size` passed through `ann_params`), and "mmap"
+    keeps rows in memory-mapped SegmentStore files under `store_path` so
+    they survive restarts and are shared between worker processes.
+
+    With `lexical=True` every partition also gets a BM25 LexicalIndex over
+    the chunk texts, used by `hybrid_search`.
+
+    Methods are blocking (IVF training, segment fsyncs) and thread-safe:
+    each partition has its own lock, so async callers can run them in
+    worker threads and a partition that is training only holds up its
+    own writers and readers.
+    """
+
+    BACKENDS = {"exact": IndexPartition, "ivf": IVFPartition, "mmap": MmapPartition}
+
+    def __init__(
+        self,
+        dimension: int,
+        backend: str = "exact",
+        store_path: Optional[str] = None,
+        lexical: bool = False,
+        **ann_params
+    ):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown vector index backend: {backend}")
+        if backend == "mmap" and not store_path:
+            raise ValueError("The mmap backend requires a store_path")
+        self.dimension = dimension
+        self.backend = backend
+        self.ann_params = ann_params
+        self.store = SegmentStore(store_path, dimension) if backend == "mmap" else None
+        self.lexical = lexical
+        # user_id -> topic_id -> (BM25 index, partition version it mirrors,
+        # row position each mirrored id had then)
+        self.lexical_indexes: Dict[str, Dict[str, List[Any]]] = {}
+        # user_id -> topic_id -> partition
+        self.partitions: Dict[str, Dict[str, IndexPartition]] = {}
+        # chunk_id -> stored payload (content, metadata, document id)
+        self.payloads: Dict[str, Dict[str, Any]] = {}
+        # document_id -> (user_id, topic_id, chunk ids)
+        self.documents: Dict[str, Tuple[str, str, List[str]]] = {}
+        # mmap backend: document_id -> stamp of the record the cache entries came from
+        self.document_stamps: Dict[str, Tuple[int, int]] = {}
+        # Guards the dicts above; (user_id, topic_id) -> lock for one partition
+        self._lock = threading.RLock()
+        self._partition_locks: Dict[Tuple[str, str], threading.RLock] = {}
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        # Zero vectors (embedding fallbacks) stay zero instead of becoming NaN
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _partition_lock(self, user_id: str, topic_id: str) -> threading.RLock:
+        with self._lock:
+            return self._partition_locks.setdefault((user_id, topic_id), threading.RLock())
+
+    def _partition(self, user_id: str, topic_id: str) -> IndexPartition:
+        with self._lock:
+            topics = self.partitions.setdefault(user_id, {})
+            partition = topics.get(topic_id)
+            if partition is None:
+                if self.store is not None:
+                    partition = MmapPartition(self.dimension, self.store, user_id, topic_id)
+                else:
+                    partition = self.BACKENDS[self.backend](self.dimension, **self.ann_params)
+                topics[topic_id] = partition
+            return partition
+
+    def _user_partitions(self, user_id: str) -> Dict[str, IndexPartition]:
+        if self.store is not None:
+            # Pick up partitions persisted before a restart or by other workers
+            for topic_id in self.store.user_topics(user_id):
+                self._partition(user_id, topic_id)
+        with self._lock:
+            # A snapshot, so callers can iterate while other threads add topics
+            return dict(self.partitions.get(user_id, {}))
+
+    def _lexical(self, user_id: str, topic_id: str) -> LexicalIndex:
+        """BM25 index of a partition; callers hold the partition lock"""
+        with self._lock:
+            entry = self.lexical_indexes.setdefault(user_id, {}).get(topic_id)
+            if entry is None:
+                entry = [LexicalIndex(), None, {}]
+                self.lexical_indexes[user_id][topic_id] = entry
+
+        partition = self.partitions.get(user_id, {}).get(topic_id)
+        version = getattr(partition, "version", None)
+        if isinstance(partition, MmapPartition) and entry[1] != version:
+            # Mirror rows persisted by other workers (or before a restart).
+            # A row that moved was rewritten, possibly with new text.
+            lexical, mirrored, live = entry[0], entry[2], partition.positions
+            stale = [item_id for item_id in lexical.slots if item_id not in live]
+            lexical.remove(stale)
+            changed = [item_id for item_id in live if item_id not in lexical or mirrored.get(item_id) != live[item_id]]
+            payloads = [(item_id, self._payload(item_id)) for item_id in changed]
+            payloads = [(item_id, p) for item_id, p in payloads if p is not None]
+            lexical.add([item_id for item_id, _ in payloads], [p["content"] for _, p in payloads])
+            entry[1] = version
+            entry[2] = {item_id: live[item_id] for item_id in lexical.slots if item_id in live}
+        return entry[0]
+
+    def _document(self, document_id: str) -> Optional[Tuple[str, str, List[str]]]:
+        entry = self.documents.get(document_id)
+        if self.store is None:
+            return entry
+
+        # Other workers may have rewritten or deleted the record since it was cached
+        stamp = self.store.document_stamp(document_id)
+        if entry is not None and stamp == self.document_stamps.get(document_id):
+            return entry
+        self._forget_document(document_id)
+        if stamp is None:
+            return None
+        record = self.store.read_document(document_id)
+        if record is None:
+            return None
+        return self._cache_record(document_id, record, stamp)
+
+    def _forget_document(self, document_id: str):
+        with self._lock:
+            entry = self.documents.pop(document_id, None)
+            self.document_stamps.pop(document_id, None)
+            for chunk_id in entry[2] if entry else []:
+                self.payloads.pop(chunk_id, None)
+
+    def _payload(self, chunk_id: str) -> Optional[Dict[str, Any]]:
+        if self.store is not None:
+            # Validates (and if need be reloads) the cached record first
+            self._document(chunk_id.rsplit(":", 1)[0])
+        return self.payloads.get(chunk_id)
+
+    def _cache_record(
+        self,
+        document_id: str,
+        record: Dict[str, Any],
+        stamp: Optional[Tuple[int, int]] = None
+    ) -> Tuple[str, str, List[str]]:
+        entry = (record["userId"], record["topicId"], record["chunkIds"])
+        with self._lock:
+            for chunk_id, payload in zip(record["chunkIds"], record["payloads"]):
+                self.payloads[chunk_id] = payload
+            self.documents[document_id] = entry
+            if stamp is not None:
+                self.document_stamps[document_id] = stamp
+        return entry
+
+    def add_document(
+        self,
+        user_id: str,
+        topic_id: str,
+        document_id: str,
+        chunks: List[str],
+        embeddings: List[List[float]],
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> List[str]:
+        """
+        Insert the chunks of one document into its user/topic partition
+
+        Args:
+            user_id: Owner of the document
+            topic_id: Topic the document belongs to
+            document_id: Identifier shared by all chunks of the document
+            chunks: Chunk texts
+            embeddings: One embedding per chunk
+            metadata: Document-level metadata copied onto every chunk
+
+        Returns:
+            Chunk ids that were indexed
+        """
+        if len(chunks) != len(embeddings):
+            raise ValueError("Each chunk needs exactly one embedding")
+
+        if self._document(document_id) is not None:
+            self.remove_document(document_id)
+
+        chunk_ids = [f"{document_id}:{i}" for i in range(len(chunks))]
+        if not chunk_ids:
+            return []
+
+        with self._partition_lock(user_id, topic_id):
+            return self._add_document(user_id, topic_id, document_id, chunks, chunk_ids, embeddings, metadata)
+
+    def _add_document(
+        self,
+        user_id: str,
+        topic_id: str,
+        document_id: str,
+        chunks: List[str],
+        chunk_ids: List[str],
+        embeddings: List[List[float]],
+        metadata: Optional[Dict[str, Any]]
+    ) -> List[str]:
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        self._partition(user_id, topic_id).add(chunk_ids, vectors)
+
+        record = {
+            "userId": user_id,
+            "topicId": topic_id,
+            "chunkIds": chunk_ids,
+            "payloads": [
+                {
+                    "content": chunk,
+                    "metadata": {
+                        **(metadata or {}),
+                        "documentId": document_id,
+                        "topicId": topic_id,
+                        "chunkIndex": i
+                    }
+                }
+                for i, chunk in enumerate(chunks)
+            ]
+        }
+        stamp = None
+        if self.store is not None:
+            self.store.write_document(document_id, record)
+            stamp = self.store.document_stamp(document_id)
+        self._cache_record(document_id, record, stamp)
+
+        if self.lexical:
+            self._lexical(user_id, topic_id).add(chunk_ids, chunks)
+        return chunk_ids
+
+    def remove_document(self, document_id: str) -> int:
+        """Delete every chunk of a document, returning how many were removed"""
+        entry = self._document(document_id)
+        if entry is None:
+            return 0
+
+        user_id, topic_id, chunk_ids = entry
+        with self._partition_lock(user_id, topic_id):
+            with self._lock:
+                if document_id not in self.documents:
+                    return 0  # removed by a concurrent caller
+                topics = self.partitions.get(user_id, {})
+                partition = topics.get(topic_id)
+            removed = partition.remove(chunk_ids) if partition else 0
+
+            self._forget_document(document_id)
+            if self.store is not None:
+                self.store.delete_document(document_id)
+
+            lexical_topics = self.lexical_indexes.get(user_id, {})
+            if topic_id in lexical_topics:
+                lexical_topics[topic_id][0].remove(chunk_ids)
+
+            if partition is not None and len(partition) == 0:
+                with self._lock:
+                    topics.pop(topic_id, None)
+                    lexical_topics.pop(topic_id, None)
+                    if not topics:
+                        self.partitions.pop(user_id, None)
+                        self.lexical_indexes.pop(user_id, None)
+        return removed
+
+    def search(
+        self,
+        user_id: str,
+        query_embedding: List[float],
+        k: int = 5,
+        topic_id: Optional[str] = None,
+        nprobe: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve the k most similar chunks for a user
+
+        Args:
+            user_id: Only this user's partitions are searched
+            query_embedding: Embedding of the query text
+            k: Number of results
+            topic_id: Restrict the search to one topic partition
+            nprobe: Per-query override of the IVF probe count (recall/latency)
+
+        Returns:
+            Results ordered by descending relevance with content and metadata
+        """
+        topics = self._user_partitions(user_id)
+        if topic_id is not None:
+            partitions = [(topic_id, topics[topic_id])] if topic_id in topics else []
+        else:
+            partitions = list(topics.items())
+
+        if not partitions:
+            return []
+
+        query = self._normalize(np.asarray(query_embedding, dtype=np.float32))
+
+        candidates: List[Tuple[str, float]] = []
+        for partition_topic, partition in partitions:
+            with self._partition_lock(user_id, partition_topic):
+                candidates.extend(partition.search(query, k, nprobe=nprobe))
+        candidates.sort(key=lambda hit: hit[1], reverse=True)
+
+        results = []
+        for chunk_id, score in candidates:
+            payload = self._payload(chunk_id)
+            if payload is None:
+                # Rows published by another worker before its document record
+                continue
+            results.append({
+                "id": chunk_id,
+                "content": payload["content"],
+                "relevance": score,
+                "metadata": payload["metadata"]
+            })
+            if len(results) == k:
+                break
+        return results
+
+    def hybrid_search(
+        self,
+        user_id: str,
+        query_text: str,
+        query_embedding: List[float],
+        k: int = 5,
+        topic_id: Optional[str] = None,
+        candidates: int = 200,
+        prefilter_min_size: int = 5000,
+        rrf_k: int = 60,
+        nprobe: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        BM25 + embedding retrieval fused with reciprocal rank fusion
+
+        For partitions of at least `prefilter_min_size` rows whose BM25 search
+        matched something, only the top `candidates` lexical hits are scored
+        densely; smaller partitions (or queries without lexical matches) also
+        run a full dense search so purely semantic matches are not lost.
+
+        Args:
+            user_id: Only this user's partitions are searched
+            query_text: Raw query used for BM25
+            query_embedding: Embedding of the query text
+            k: Number of results
+            topic_id: Restrict the search to one topic partition
+            candidates: Depth of each ranked list before fusion
+            prefilter_min_size: Partition size from which the lexical prefilter applies
+            rrf_k: Reciprocal rank fusion constant
+            nprobe: Per-query override of the IVF probe count
+
+        Returns:
+            Results ordered by fused rank; relevance is the cosine similarity
+        """
+        if not self.lexical:
+            return self.search(user_id, query_embedding, k, topic_id, nprobe)
+
+        topics = self._user_partitions(user_id)
+        if topic_id is not None:
+            topics = {topic_id: topics[topic_id]} if topic_id in topics else {}
+        if not topics:
+            return []
+
+        query = self._normalize(np.asarray(query_embedding, dtype=np.float32))
+
+        lexical_hits: List[Tuple[str, float]] = []
+        dense_scores: Dict[str, float] = {}
+        for partition_topic, partition in topics.items():
+            with self._partition_lock(user_id, partition_topic):
+                hits = self._lexical(user_id, partition_topic).search(query_text, candidates)
+                lexical_hits.extend(hits)
+
+                if hits and len(partition) >= prefilter_min_size:
+                    dense_scores.update(partition.score_ids(query, [item_id for item_id, _ in hits]))
+                else:
+                    dense_scores.update(partition.search(query, candidates, nprobe=nprobe))
+                    missing = [item_id for item_id, _ in hits if item_id not in dense_scores]
+                    dense_scores.update(partition.score_ids(query, missing))
+
+        lexical_hits.sort(key=lambda hit: hit[1], reverse=True)
+        dense_ranked = sorted(dense_scores, key=dense_scores.get, reverse=True)[:candidates]
+
+        fused: Dict[str, float] = {}
+        for rank, (item_id, _) in enumerate(lexical_hits[:candidates]):
+            fused[item_id] = fused.get(item_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+        for rank, item_id in enumerate(dense_ranked):
+            fused[item_id] = fused.get(item_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+
+        results = []
+        for item_id in sorted(fused, key=fused.get, reverse=True):
+            payload = self._payload(item_id)
+            if payload is None:
+                continue
+            results.append({
+                "id": item_id,
+                "content": payload["content"],
+                "relevance": dense_scores.get(item_id, 0.0),
+                "metadata": payload["metadata"]
+            })
+            if len(results) == k:
+                break
+        return results
+
+    def count(self, user_id: str, topic_id: Optional[str] = None) -> int:
+        """Number of indexed chunks for a user (optionally one topic)"""
+        topics = self._user_partitions(user_id)
+        if topic_id is not None:
+            topics = {topic_id: topics[topic_id]} if topic_id in topics else {}
+        total = 0
+        for partition_topic, partition in topics.items():
+            with self._partition_lock(user_id, partition_topic):
+                total += len(partition)
+        return total
@@ -2,7 +2,27 @@ import torch
 import torch.nn as nn
 import numpy as np
 import os
-from typing import List, Dict, Any
+import warnings
+import zlib
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+from torch.nn.utils.rnn import pack_padded_sequence
+
+# Time of day: Morning=0, Afternoon=1, Evening=2, Night=3
+TIME_OF_DAY = {'MORNING': 0.0, 'AFTERNOON': 0.25, 'EVENING': 0.5, 'NIGHT': 0.75}
+
+# Raw session columns are divided by these to get the model features
+FEATURE_SCALE = np.array([1.0, 1.0, 60000.0, 1000.0, 1.0, 100.0, 1.0])
+
+@lru_cache(maxsize=4096)
+def app_category(package_name: str) -> float:
+    """
+    App category code (simplified hash) in [0, 0.9].
+
+    crc32 gives every process the same code for an app; the built-in
+    hash() is salted per interpreter, so workers disagreed.
+    """
+    return (zlib.crc32(package_name.encode('utf-8')) % 10) / 10.0
 
 class LSTMDoomscrollModel(nn.Module):
     def __init__(self, input_size, hidden_size, num_layers, output_size):
@@ -21,8 +41,26 @@ class LSTMDoomscrollModel(nn.Module):
         out = self.fc(out[:, -1, :])
         return self.sigmoid(out)
 
+    def advance(self, x, state):
+        """Run x (a tensor or PackedSequence) on from state (h, c) and return the new (h, c)"""
+        _, state = self.lstm(x, state)
+        return state
+
+    def score(self, h):
+        """Probability from the top layer's hidden state, as forward() computes it"""
+        return self.sigmoid(self.fc(h[-1]))
+
+# eager PyTorch, a frozen TorchScript trace, or LSTM/Linear dynamically quantised to int8
+RUNTIMES = ("eager", "torchscript", "int8")
+
 class DoomscrollDetector:
-    def __init__(self, model_path: str = "model.pth"):
+    def __init__(self, model_path: str = "model.pth", runtime: str = "eager", num_threads: int = 0):
+        if runtime not in RUNTIMES:
+            raise ValueError(f"Unknown doomscroll runtime: {runtime}")
+        # Process-wide: several workers on one host should split the cores
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+
         self.input_features = [
             'time_of_day_encoded',
             'app_category_encoded',
@@ -50,49 +88,180 @@ class DoomscrollDetector:
         else:
             print("No model found, using initialized weights (Mock/Heuristic mode)")
 
+        self.runtime = runtime
+        self.scorer = self._build_scorer(runtime)
+
+    def _build_scorer(self, runtime: str):
+        """
+        Module used for full-window scoring. Incremental steps call
+        self.model directly, so they are only affected by int8.
+        """
+        if runtime == "int8":
+            # In place, so advance()/score() run the quantised layers too
+            torch.quantization.quantize_dynamic(
+                self.model, {nn.LSTM, nn.Linear}, dtype=torch.qint8, inplace=True
+            )
+            return self.model
+        if runtime == "torchscript":
+            try:
+                with warnings.catch_warnings():
+                    # TorchScript is deprecated upstream but still the fastest path here
+                    warnings.simplefilter("ignore")
+                    traced = torch.jit.trace(self.model, torch.zeros(1, 10, self.input_size))
+                    return torch.jit.optimize_for_inference(torch.jit.freeze(traced.eval()))
+            except Exception as e:
+                print(f"TorchScript trace failed ({e}), using eager model")
+                self.runtime = "eager"
+        return self.model
+
     def engineer_features(self, session_window: List[Dict[str, Any]]) -> torch.Tensor:
         """
         Transform raw session data into tensor input for LSTM.
         Window size should be fixed (e.g., 10 sessions).
         """
-        features_list = []
-        for session in session_window:
-            # Simple encoding logic for demo
-            # Time of day: Morning=0, Afternoon=1, Evening=2, Night=3
-            tod_map = {'MORNING': 0.0, 'AFTERNOON': 0.25, 'EVENING': 0.5, 'NIGHT': 0.75}
-            tod = session.get('timeOfDay', 'MORNING')
-            
-            # App Category (simplified hash)
-            app_hash = (hash(session.get('appPackageName', '')) % 10) / 10.0
-            
-            feat = [
-                tod_map.get(tod, 0.0), # time_of_day_encoded
-                app_hash,              # app_category_encoded
-                float(session.get('sessionDuration', 0)) / 60000.0, # duration (mins)
-                float(session.get('scrollDistance', 0)) / 1000.0,   # velocity approx
-                float(session.get('interactionCount', 0)),          # interaction rate
-                float(session.get('batteryLevel', 100)) / 100.0,    # battery
-                1.0 if session.get('dayType') == 'WEEKEND' else 0.0 # day_of_week
-            ]
-            features_list.append(feat)
-            
-        # Pad if less than 10
-        while len(features_list) < 10:
-            features_list.append([0.0] * self.input_size)
-            
-        return torch.tensor([features_list], dtype=torch.float32)
+        return torch.from_numpy(self.engineer_features_batch([session_window]))
+
+    def engineer_features_batch(self, session_windows: List[List[Dict[str, Any]]], steps: int = 10) -> np.ndarray:
+        """
+        Features for many windows as one preallocated (B, steps, 7) float32
+        array, zero-padded after each window's sessions. Windows longer than
+        `steps` keep their most recent sessions.
+        """
+        features = np.zeros((len(session_windows), steps, self.input_size), dtype=np.float32)
+        windows = [window[-steps:] for window in session_windows]
+        lengths = np.fromiter((len(window) for window in windows), dtype=np.int64, count=len(windows))
+        if not lengths.any():
+            return features
+
+        # Only the dict lookups are per session; the scaling is one array op
+        raw = np.array([
+            (
+                TIME_OF_DAY.get(session.get('timeOfDay', 'MORNING'), 0.0), # time_of_day_encoded
+                app_category(session.get('appPackageName', '')),          # app_category_encoded
+                session.get('sessionDuration', 0),                         # duration (mins)
+                session.get('scrollDistance', 0),                          # velocity approx
+                session.get('interactionCount', 0),                        # interaction rate
+                session.get('batteryLevel', 100),                          # battery
+                session.get('dayType') == 'WEEKEND'                        # day_of_week
+            )
+            for window in windows
+            for session in window
+        ], dtype=np.float64)
+        # A null field would otherwise turn the whole window's score into NaN
+        np.nan_to_num(raw, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+        features[np.arange(steps) < lengths[:, None]] = raw / FEATURE_SCALE
+        return features
 
     def predict(self, session_window: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
         Predict probability of doomscrolling.
         """
-        if not session_window:
-            return {'risk_level': 'LOW', 'probability': 0.0}
+        return self.predict_batch([session_window])[0]
 
-        with torch.no_grad():
-            features = self.engineer_features(session_window)
-            prediction = self.model(features).item()
-            
+    def predict_batch(self, session_windows: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        Predict for many users' windows with one padded (B, 10, 7) forward pass.
+        """
+        results = [None] * len(session_windows)
+        active = [i for i, window in enumerate(session_windows) if window]
+        for i, window in enumerate(session_windows):
+            if not window:
+                results[i] = {'risk_level': 'LOW', 'probability': 0.0}
+
+        if active:
+            with torch.inference_mode():
+                features = torch.from_numpy(self.engineer_features_batch([session_windows[i] for i in active]))
+                predictions = self.scorer(features).squeeze(1).tolist()
+            for i, prediction in zip(active, predictions):
+                results[i] = self._classify(prediction)
+        return results
+
+    def predict_incremental(
+        self,
+        session_windows: List[List[Dict[str, Any]]],
+        new_counts: List[int],
+        states: List[Optional[Dict[str, Any]]],
+        refresh_steps: int = 10
+    ) -> Tuple[List[Dict[str, Any]], List[Optional[Dict[str, Any]]]]:
+        """
+        Predict by advancing each user's cached LSTM state over only the
+        sessions that are new since the last call.
+
+        A state is {"h", "c": (num_layers, hidden) arrays, "steps": sessions
+        fed since the last full-window recompute}. A missing state, or one
+        that would pass refresh_steps, is rebuilt from zeros over the whole
+        window instead. Windows shorter than 10 get their zero-padding steps
+        run from the state (not kept in it), matching predict_batch; once a
+        window is full the state also carries sessions that have slid out
+        of it, so scores can drift from a full replay until the next
+        recompute (refresh_steps=0 recomputes every time).
+
+        Returns:
+            Results as predict_batch, and the new state per window (None for empty ones)
+        """
+        results = [None] * len(session_windows)
+        new_states = [None] * len(session_windows)
+
+        # Rebuilt users replay their whole window from zeros and steppers only
+        # their new sessions, in separate calls: one-session steppers then
+        # cost a single (B, 1, 7) LSTM step rather than the longest window
+        groups: Dict[bool, List[int]] = {}
+        fed_counts = [0] * len(session_windows)
+        for i, window in enumerate(session_windows):
+            if not window:
+                results[i] = {'risk_level': 'LOW', 'probability': 0.0}
+                continue
+            state = states[i]
+            new = min(new_counts[i], len(window))
+            rebuild = state is None or new >= len(window) or state['steps'] + new > refresh_steps
+            fed_counts[i] = len(window) if rebuild else new
+            groups.setdefault(rebuild, []).append(i)
+
+        with torch.inference_mode():
+            for rebuild, members in groups.items():
+                fed = [session_windows[i][-fed_counts[i]:] for i in members]
+                state = None
+                if not rebuild:
+                    state = (
+                        torch.from_numpy(np.stack([states[i]['h'] for i in members], 1)),
+                        torch.from_numpy(np.stack([states[i]['c'] for i in members], 1))
+                    )
+                h, c = self._advance(fed, state)
+                predictions = self._score_padded(h, c, [10 - len(session_windows[i]) for i in members])
+                # Per-user states are views into one array: slicing tensors per user costs more than the step
+                h, c = h.numpy(), c.numpy()
+                for j, (i, prediction) in enumerate(zip(members, predictions)):
+                    results[i] = self._classify(prediction)
+                    steps = 0 if rebuild else states[i]['steps'] + fed_counts[i]
+                    new_states[i] = {'h': h[:, j], 'c': c[:, j], 'steps': steps}
+        return results, new_states
+
+    def _advance(self, sessions: List[List[Dict[str, Any]]], state) -> Tuple[torch.Tensor, torch.Tensor]:
+        """(h, c) after feeding each row's sessions from state (zeros if None)"""
+        lengths = [len(fed) for fed in sessions]
+        x = torch.from_numpy(self.engineer_features_batch(sessions, steps=max(lengths)))
+        if len(set(lengths)) > 1:
+            x = pack_padded_sequence(x, torch.tensor(lengths), batch_first=True, enforce_sorted=False)
+        return self.model.advance(x, state)
+
+    def _score_padded(self, h: torch.Tensor, c: torch.Tensor, pads: List[int]) -> List[float]:
+        """Scores after running each short window's trailing zero padding, as predict_batch does"""
+        padded = [j for j, pad in enumerate(pads) if pad > 0]
+        if padded:
+            lengths = torch.tensor([pads[j] for j in padded])
+            packed = pack_padded_sequence(
+                torch.zeros(len(padded), int(lengths.max()), self.input_size),
+                lengths,
+                batch_first=True,
+                enforce_sorted=False
+            )
+            h_pad, _ = self.model.advance(packed, (h[:, padded], c[:, padded]))
+            h = h.clone()
+            h[:, padded] = h_pad
+        return self.model.score(h).squeeze(1).tolist()
+
+    @staticmethod
+    def _classify(prediction: float) -> Dict[str, Any]:
         risk_level = 'LOW'
         if prediction > 0.8:
             risk_level = 'CRITICAL'
@@ -0,0 +1,139 @@
+"""
+Screen-time event throughput: the old per-message loop vs batched processing.
+
+Without --redis-url only the model side is measured: one batch-of-one
+forward pass per event vs one padded (B, 10, 7) pass per batch, with
+windows kept in memory. With --redis-url the Redis window updates are
+included too (the per-message path replays the old rpush/ltrim/lrange
+per event). Kafka publishing is left out in both cases.
+
+Usage (from services/ai-service):
+    python scripts/benchmark_doomscroll_consumer.py --events 5000 --users 200 --batch 500 [--runtime torchscript] [--redis-url redis://localhost:6379]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict, deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+APPS = ["com.instagram.android", "com.zhiliaoapp.musically", "com.google.android.youtube",
+        "com.reddit.frontpage", "com.whatsapp", "org.khanacademy.android"]
+
+def synthetic_events(count: int, users: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [
+        {
+            "userId": f"bench-user-{rng.randrange(users)}",
+            "appPackageName": rng.choice(APPS),
+            "timeOfDay": rng.choice(["MORNING", "AFTERNOON", "EVENING", "NIGHT"]),
+            "sessionDuration": rng.randint(10_000, 3_600_000),
+            "scrollDistance": rng.randint(0, 50_000),
+            "interactionCount": rng.randint(0, 200),
+            "batteryLevel": rng.randint(5, 100),
+            "dayType": rng.choice(["WEEKDAY", "WEEKEND"]),
+            "timestamp": i
+        }
+        for i in range(count)
+    ]
+
+def model_only(detector, events, batch_size: int):
+    windows = defaultdict(lambda: deque(maxlen=10))
+    start = time.perf_counter()
+    for event in events:
+        window = windows[event["userId"]]
+        window.append(event)
+        detector.predict(list(window))
+    per_message = len(events) / (time.perf_counter() - start)
+
+    windows.clear()
+    start = time.perf_counter()
+    for offset in range(0, len(events), batch_size):
+        touched = {}
+        for event in events[offset:offset + batch_size]:
+            windows[event["userId"]].append(event)
+            touched[event["userId"]] = True
+        detector.predict_batch([list(windows[user]) for user in touched])
+    batched = len(events) / (time.perf_counter() - start)
+    return per_message, batched
+
+async def with_redis(url: str, detector, events, batch_size: int):
+    import redis.asyncio as redis
+    from app.services import consumer
+
+    client = redis.Redis.from_url(url, decode_responses=True)
+    consumer.redis_client = client
+
+    async def no_publish(interventions):
+        pass
+
+    consumer._publish_interventions = no_publish
+
+    async def legacy(event_data):
+        window_key = f"user:{event_data['userId']}:screen_time_window"
+        await client.rpush(window_key, json.dumps(event_data))
+        await client.ltrim(window_key, -10, -1)
+        window = [json.loads(x) for x in await client.lrange(window_key, 0, -1)]
+        detector.predict(window)
+
+    async def reset():
+        keys = [key async for key in client.scan_iter("user:bench-user-*")]
+        if keys:
+            await client.delete(*keys)
+
+    await reset()
+    start = time.perf_counter()
+    for event in events:
+        await legacy(event)
+    per_message = len(events) / (time.perf_counter() - start)
+
+    await reset()
+    start = time.perf_counter()
+    for offset in range(0, len(events), batch_size):
+        await consumer.process_screen_time_batch(events[offset:offset + batch_size])
+    batched = len(events) / (time.perf_counter() - start)
+
+    await reset()
+    await client.close()
+    return per_message, batched
+
+def main():
+    import logging
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--redis-url", default=None)
+    parser.add_argument("--runtime", default="eager", help="eager | torchscript | int8")
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = default)")
+    args = parser.parse_args()
+
+    # Per-user INFO lines would dominate the timings
+    logging.disable(logging.INFO)
+
+    from ml_models.doomscroll import DoomscrollDetector
+
+    detector = DoomscrollDetector(
+        model_path=os.environ.get("DOOMSCROLL_MODEL_PATH", "model.pth"),
+        runtime=args.runtime,
+        num_threads=args.threads
+    )
+    events = synthetic_events(args.events, args.users)
+    detector.predict_batch([events[:10]])  # warm-up
+
+    print(f"events={args.events} users={args.users} batch={args.batch} runtime={detector.runtime}")
+    print(f"{'path':<22}{'per-message ev/s':>18}{'batched ev/s':>16}{'speedup':>10}")
+    per_message, batched = model_only(detector, events, args.batch)
+    print(f"{'model only':<22}{per_message:>18.0f}{batched:>16.0f}{batched / per_message:>9.1f}x")
+
+    if args.redis_url:
+        per_message, batched = asyncio.run(with_redis(args.redis_url, detector, events, args.batch))
+        print(f"{'redis + model':<22}{per_message:>18.0f}{batched:>16.0f}{batched / per_message:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Doomscroll feature engineering: the original per-session list building vs
+the vectorized engineer_features_batch.
+
+The original built Python lists per window (with tod_map rebuilt per
+session and a while-loop pad) and concatenated one tensor per window; it
+is reproduced here as the baseline. Outputs are compared on every column
+but app category, which used the per-process salted hash().
+
+Usage (from services/ai-service):
+    python scripts/benchmark_doomscroll_features.py --windows 500 --repeat 20
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import torch
+
+from scripts.benchmark_doomscroll_consumer import synthetic_events
+
+def legacy_engineer_features(session_window, input_size=7):
+    features_list = []
+    for session in session_window:
+        tod_map = {'MORNING': 0.0, 'AFTERNOON': 0.25, 'EVENING': 0.5, 'NIGHT': 0.75}
+        tod = session.get('timeOfDay', 'MORNING')
+        app_hash = (hash(session.get('appPackageName', '')) % 10) / 10.0
+        features_list.append([
+            tod_map.get(tod, 0.0),
+            app_hash,
+            float(session.get('sessionDuration', 0)) / 60000.0,
+            float(session.get('scrollDistance', 0)) / 1000.0,
+            float(session.get('interactionCount', 0)),
+            float(session.get('batteryLevel', 100)) / 100.0,
+            1.0 if session.get('dayType') == 'WEEKEND' else 0.0
+        ])
+    while len(features_list) < 10:
+        features_list.append([0.0] * input_size)
+    return torch.tensor([features_list], dtype=torch.float32)
+
+def timed(fn, repeat: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--windows", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    from ml_models.doomscroll import DoomscrollDetector
+
+    detector = DoomscrollDetector(model_path=os.environ.get("DOOMSCROLL_MODEL_PATH", "model.pth"))
+    events = synthetic_events(args.windows * 10, args.windows)
+    # Mostly full windows with some short ones, as a consumer batch sees
+    windows = [events[i * 10:i * 10 + 10 - (i % 4 == 0) * (i % 9)] for i in range(args.windows)]
+
+    legacy = torch.cat([legacy_engineer_features(window) for window in windows]).numpy()
+    vectorized = detector.engineer_features_batch(windows)
+    columns = [0, 2, 3, 4, 5, 6]
+    if not np.array_equal(legacy[:, :, columns], vectorized[:, :, columns]):
+        sys.exit("vectorized features differ from the original")
+
+    legacy_time = timed(lambda: torch.cat([legacy_engineer_features(window) for window in windows]), args.repeat)
+    vectorized_time = timed(lambda: torch.from_numpy(detector.engineer_features_batch(windows)), args.repeat)
+    print(f"windows={args.windows} (features identical apart from app category)")
+    print(f"{'path':<14}{'ms/batch':>10}{'us/window':>11}")
+    for name, seconds in (("per-window", legacy_time), ("vectorized", vectorized_time)):
+        print(f"{name:<14}{seconds * 1e3:>10.2f}{seconds * 1e6 / args.windows:>11.1f}")
+    print(f"speedup {legacy_time / vectorized_time:.1f}x")
+
+if __name__ == "__main__":
+    main()
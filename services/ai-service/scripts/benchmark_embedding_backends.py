@@ -0,0 +1,107 @@
+"""
+Latency, resident memory and fp32 drift of the embedding inference backends.
+
+Each backend is loaded in its own process so RSS numbers are not polluted by
+the others. Drift is the cosine similarity between a backend's embeddings and
+the fp32 "torch" baseline on the same texts; the script exits non-zero if any
+backend falls below EMBEDDING_MIN_COSINE.
+
+Usage (from services/ai-service):
+    python scripts/benchmark_embedding_backends.py --backends torch torch-int8 onnx
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SAMPLE_TEXTS = [
+    "Photosynthesis converts light energy into chemical energy stored in glucose.",
+    "The derivative of sin(x) is cos(x).",
+    "Newton's second law states that force equals mass times acceleration.",
+    "Mitochondria are the powerhouse of the cell.",
+    "In JEE Main 2024, the physics section had 30 questions.",
+    "A binary search tree keeps keys in sorted order for logarithmic lookups.",
+    "The French Revolution began in 1789.",
+    "Supply and demand determine the market price of goods.",
+]
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+def run_backend(name: str, model: str, batch_sizes, repeats: int, queue):
+    from app.services.embedding_backends import create_backend
+
+    before = rss_mb()
+    start = time.perf_counter()
+    backend = create_backend(name, model)
+    load_s = time.perf_counter() - start
+    texts = (SAMPLE_TEXTS * 16)[:max(batch_sizes)]
+    backend.encode(texts[:2])  # warm-up
+
+    latencies = {}
+    for size in batch_sizes:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            backend.encode(texts[:size])
+        latencies[size] = (time.perf_counter() - start) * 1000 / repeats
+
+    queue.put({
+        "name": name,
+        "effective": backend.name,
+        "load_s": load_s,
+        "rss_mb": rss_mb() - before,
+        "latencies": latencies,
+        "embeddings": np.asarray(backend.encode(SAMPLE_TEXTS), dtype=np.float32)
+    })
+
+def main():
+    from app.core.config import get_settings
+    from app.services.embedding_backends import measure_drift
+
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "torch-int8", "onnx"])
+    parser.add_argument("--model", default=settings.EMBEDDING_MODEL)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for name in ["torch"] + [b for b in args.backends if b != "torch"]:
+        queue = context.Queue()
+        process = context.Process(target=run_backend, args=(name, args.model, args.batch_sizes, args.repeats, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+
+    baseline = results[0]["embeddings"]
+    header = "".join(f"{'bs=' + str(size) + ' ms':>12}" for size in args.batch_sizes)
+    print(f"model={args.model}")
+    print(f"{'backend':<12}{'load s':>8}{'rss MB':>9}{header}{'min cos':>10}{'mean cos':>10}")
+
+    failed = False
+    for result in results:
+        drift = measure_drift(result["embeddings"], baseline)
+        failed |= drift["min_cosine"] < settings.EMBEDDING_MIN_COSINE
+        label = result["name"] if result["name"] == result["effective"] else f"{result['name']}*"
+        timings = "".join(f"{result['latencies'][size]:>12.1f}" for size in args.batch_sizes)
+        print(f"{label:<12}{result['load_s']:>8.1f}{result['rss_mb']:>9.0f}{timings}"
+              f"{drift['min_cosine']:>10.4f}{drift['mean_cosine']:>10.4f}")
+
+    if any(r["name"] != r["effective"] for r in results):
+        print("* backend unavailable here, fell back to torch")
+    if failed:
+        print(f"Drift check FAILED (min cosine < {settings.EMBEDDING_MIN_COSINE})")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Size and decode cost of cached embeddings: legacy JSON floats vs binary encodings.
+
+Reports payload bytes per entry, encode/decode latency and the cosine drift
+introduced by the lossy encodings. With --redis-url it also stores sample
+keys and reads Redis' own MEMORY USAGE for each format.
+
+Usage (from services/ai-service):
+    python scripts/benchmark_embedding_cache.py --count 2000 [--redis-url redis://localhost:6379]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.embedding_codec import ENCODINGS, encode_embedding, decode_embedding
+
+def time_per_item(fn, items) -> float:
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - start) * 1e6 / len(items)
+
+def redis_memory_usage(url: str, payloads) -> float:
+    import redis
+
+    client = redis.Redis.from_url(url)
+    keys = [f"bench:embedding:{i}" for i in range(len(payloads))]
+    pipe = client.pipeline(transaction=False)
+    for key, payload in zip(keys, payloads):
+        pipe.set(key, payload)
+    pipe.execute()
+
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.memory_usage(key)
+    usage = pipe.execute()
+    client.delete(*keys)
+    return float(np.mean(usage))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.count, args.dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    lists = [v.tolist() for v in vectors]
+
+    rows = []
+    json_payloads = [json.dumps(v) for v in lists]
+    rows.append((
+        "json",
+        np.mean([len(p.encode("utf-8")) for p in json_payloads]),
+        time_per_item(json.dumps, lists),
+        time_per_item(json.loads, json_payloads),
+        0.0,
+        redis_memory_usage(args.redis_url, json_payloads) if args.redis_url else None
+    ))
+
+    for encoding in ENCODINGS:
+        payloads = [encode_embedding(v, encoding) for v in vectors]
+        decoded = np.stack([decode_embedding(p, encoding) for p in payloads])
+        cosine = np.sum(decoded * vectors, axis=1) / np.linalg.norm(decoded, axis=1)
+        rows.append((
+            encoding,
+            np.mean([len(p) for p in payloads]),
+            time_per_item(lambda v: encode_embedding(v, encoding), vectors),
+            time_per_item(lambda p: decode_embedding(p, encoding).tolist(), payloads),
+            float(np.max(1 - cosine)),
+            redis_memory_usage(args.redis_url, payloads) if args.redis_url else None
+        ))
+
+    print(f"entries={args.count} dim={args.dimension}")
+    print(f"{'format':<10}{'bytes':>9}{'redis B':>9}{'enc us':>9}{'dec us':>9}{'max 1-cos':>12}")
+    for name, size, encode_us, decode_us, drift, redis_bytes in rows:
+        redis_col = f"{redis_bytes:>9.0f}" if redis_bytes is not None else f"{'-':>9}"
+        print(f"{name:<10}{size:>9.0f}{redis_col}{encode_us:>9.1f}{decode_us:>9.1f}{drift:>12.2e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Import-time profile of the service entry point (python -X importtime).
+
+Runs the import in a fresh interpreter, prints the total and the slowest
+top-level packages by cumulative time, and flags heavy ML libraries that
+should only load lazily. Use --json to append a machine-readable record
+for tracking over time; the exit code is non-zero if a lazy module was
+imported eagerly.
+
+Usage (from services/ai-service):
+    python scripts/benchmark_import_time.py [--module app.main] [--top 15] [--json]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+SERVICE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must not be imported by `import app.main`; they load with the models
+LAZY_MODULES = ["torch", "sklearn", "sentence_transformers", "transformers", "onnxruntime"]
+
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def profile(module: str):
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SERVICE_ROOT,
+        capture_output=True,
+        text=True
+    )
+    wall = time.perf_counter() - start
+    if completed.returncode != 0:
+        sys.stderr.write(completed.stderr[-2000:])
+        sys.exit(completed.returncode)
+
+    cumulative = {}
+    for line in completed.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            cumulative[match.group(4)] = int(match.group(2))
+    return wall, cumulative
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    wall, cumulative = profile(args.module)
+    top_level = {name: us for name, us in cumulative.items() if "." not in name}
+    slowest = sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:args.top]
+    eager = [name for name in LAZY_MODULES if name in cumulative]
+
+    if args.json:
+        print(json.dumps({
+            "module": args.module,
+            "wall_seconds": round(wall, 3),
+            "import_seconds": round(cumulative.get(args.module, 0) / 1e6, 3),
+            "top": {name: round(us / 1e6, 3) for name, us in slowest},
+            "eager_heavy_modules": eager
+        }))
+    else:
+        print(f"{args.module}: import {cumulative.get(args.module, 0) / 1e6:.2f}s (process wall {wall:.2f}s)")
+        print(f"{'package':<32}{'cumulative s':>14}")
+        for name, us in slowest:
+            print(f"{name:<32}{us / 1e6:>14.3f}")
+        print("lazy modules imported eagerly: " + (", ".join(eager) if eager else "none"))
+
+    sys.exit(1 if eager else 0)
+
+if __name__ == "__main__":
+    main()
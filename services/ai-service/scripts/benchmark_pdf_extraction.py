@@ -0,0 +1,123 @@
+"""
+PDF text extraction: inline on the event loop vs the PdfExtractor process pool.
+
+Reports wall time and the worst event-loop stall (how late a 10 ms ticker
+fired) while a document is extracted. Uses a synthetic text PDF of
+--pages pages unless --pdf points at a real file.
+
+Usage (from services/ai-service):
+    python scripts/benchmark_pdf_extraction.py --pages 300 --workers 4 --pages-per-task 50
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LINE = "Photosynthesis converts light energy into chemical energy stored in glucose molecules."
+
+def synthetic_pdf(pages: int, lines_per_page: int = 45) -> bytes:
+    """Minimal uncompressed PDF with one Helvetica text block per page"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the kids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for page in range(pages):
+        text = "".join(f"({LINE} {page}.{i}) Tj T* " for i in range(lines_per_page))
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {text}ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects))
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), pages)
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+def extract_inline(data: bytes) -> str:
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(data))
+    return "\n\n".join(page.extract_text() for page in reader.pages)
+
+async def measure(label: str, work):
+    stall = 0.0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal stall
+        loop = asyncio.get_running_loop()
+        while not done.is_set():
+            expected = loop.time() + 0.01
+            await asyncio.sleep(0.01)
+            stall = max(stall, loop.time() - expected)
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(0.02)
+    start = time.perf_counter()
+    text = await work()
+    wall = time.perf_counter() - start
+    done.set()
+    await tick
+    print(f"{label:<28}{wall:>10.2f}{stall * 1000:>16.0f}{len(text):>12}")
+
+async def main():
+    from app.services.pdf_extraction import PdfExtractor
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--pdf", help="benchmark a real file instead of a synthetic one")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--pages-per-task", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            data = f.read()
+    else:
+        data = synthetic_pdf(args.pages)
+    print(f"document: {len(data) / 1e6:.1f} MB, workers={args.workers}, pages/task={args.pages_per_task}")
+
+    extractor = PdfExtractor(max_workers=args.workers, pages_per_task=args.pages_per_task, timeout=600)
+    # Start the workers outside the measurement (spawn + imports)
+    await extractor.extract(synthetic_pdf(1))
+
+    print(f"{'mode':<28}{'wall s':>10}{'max stall ms':>16}{'chars':>12}")
+
+    async def inline():
+        return extract_inline(data)
+
+    async def pooled():
+        return await extractor.extract(data)
+
+    single = PdfExtractor(max_workers=1, pages_per_task=10 ** 9, timeout=600)
+    await single.extract(synthetic_pdf(1))
+
+    async def single_task():
+        return await single.extract(data)
+
+    await measure("inline (event loop)", inline)
+    await measure("pool, one task", single_task)
+    await measure("pool, page ranges", pooled)
+    single.shutdown()
+    extractor.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,26 @@
+import random
+
+import pytest
+
+APPS = ["com.instagram.android", "com.zhiliaoapp.musically", "com.google.android.youtube", "org.khanacademy.android"]
+
+@pytest.fixture
+def user_sessions():
+    """Factory: `count` random screen-time sessions for one user, in order"""
+    def make(count, user="u", seed=0):
+        rng = random.Random(f"{user}:{seed}")
+        return [
+            {
+                "userId": user,
+                "appPackageName": rng.choice(APPS),
+                "timeOfDay": rng.choice(["MORNING", "AFTERNOON", "EVENING", "NIGHT"]),
+                "sessionDuration": rng.randint(10_000, 3_600_000),
+                "scrollDistance": rng.randint(0, 50_000),
+                "interactionCount": rng.randint(0, 200),
+                "batteryLevel": rng.randint(5, 100),
+                "dayType": rng.choice(["WEEKDAY", "WEEKEND"]),
+                "timestamp": i
+            }
+            for i in range(count)
+        ]
+    return make
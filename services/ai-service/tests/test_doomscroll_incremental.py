@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+import torch
+
+from ml_models.doomscroll import DoomscrollDetector
+
+TOLERANCE = 1e-5
+
+@pytest.fixture(scope="module")
+def detector():
+    torch.manual_seed(0)
+    return DoomscrollDetector(model_path="does-not-exist.pth")
+
+def feed(detector, sessions, per_batch, refresh_steps):
+    """Feed sessions a few at a time; return (replay, incremental) probabilities per batch"""
+    window, state, pairs = [], None, []
+    for offset in range(0, len(sessions), per_batch):
+        new = sessions[offset:offset + per_batch]
+        window = (window + new)[-10:]
+        expected = detector.predict_batch([window])[0]
+        [got], [state] = detector.predict_incremental([window], [len(new)], [state], refresh_steps)
+        pairs.append((len(window), state, expected["probability"], got["probability"]))
+    return pairs
+
+def test_short_windows_match_replay(detector, user_sessions):
+    # Until the window is full nothing slides out, so advancing is exact
+    for per_batch in (1, 2, 3):
+        for length, state, expected, got in feed(detector, user_sessions(9), per_batch, refresh_steps=100):
+            assert got == pytest.approx(expected, abs=TOLERANCE)
+
+def test_refresh_rebuilds_from_the_full_window(detector, user_sessions):
+    pairs = feed(detector, user_sessions(40), 1, refresh_steps=4)
+    # Steps reset to 0 every time the refresh budget would be exceeded
+    steps = [state["steps"] for _, state, _, _ in pairs]
+    assert 0 in steps[10:] and max(steps) <= 4
+    for length, state, expected, got in pairs:
+        if state["steps"] == 0:
+            assert got == pytest.approx(expected, abs=TOLERANCE)
+
+def test_refresh_zero_always_replays(detector, user_sessions):
+    for length, state, expected, got in feed(detector, user_sessions(25), 2, refresh_steps=0):
+        assert state["steps"] == 0
+        assert got == pytest.approx(expected, abs=TOLERANCE)
+
+def test_mixed_batch_matches_separate_calls(detector, user_sessions):
+    # Stepping and rebuilding users in one call score as they would alone
+    sessions = {user: user_sessions(12, user) for user in ("a", "b", "c", "d")}
+    _, [warm_a, warm_b] = detector.predict_incremental(
+        [sessions["a"][:8], sessions["b"][:10]], [8, 10], [None, None], refresh_steps=10
+    )
+    windows = [sessions["a"][:9], sessions["b"][2:12], sessions["c"][:5], []]
+    new_counts = [1, 2, 5, 0]
+    states = [warm_a, warm_b, None, None]
+    results, new_states = detector.predict_incremental(windows, new_counts, states, refresh_steps=10)
+    for i in range(3):
+        [alone], [alone_state] = detector.predict_incremental([windows[i]], [new_counts[i]], [states[i]], 10)
+        assert results[i]["probability"] == pytest.approx(alone["probability"], abs=TOLERANCE)
+        assert new_states[i]["steps"] == alone_state["steps"]
+    assert [state["steps"] for state in new_states[:3]] == [1, 2, 0]
+    assert results[3] == {"risk_level": "LOW", "probability": 0.0} and new_states[3] is None
+
+class FakeStates:
+    def __init__(self):
+        self.saved = {}
+
+    async def set_many(self, states):
+        self.saved.update(states)
+
+def test_consumer_rebuilds_state_with_stale_seen(detector, user_sessions, monkeypatch):
+    from app.services import consumer
+
+    fake = FakeStates()
+    monkeypatch.setattr(consumer, "doomscroll_states", fake)
+    sessions = user_sessions(14)
+    window = sessions[-10:]
+    _, [state] = detector.predict_incremental([sessions[-11:-1]], [10], [None], 10)
+    # The state says it has seen 11 sessions, but 13 came before this one:
+    # another replica scored a batch this state never saw
+    state["seen"] = 11
+
+    results = asyncio.run(consumer._predict_incremental(detector, {"u": sessions[-1:]}, [window], [14], [state]))
+
+    assert results[0]["probability"] == pytest.approx(detector.predict_batch([window])[0]["probability"], abs=TOLERANCE)
+    assert fake.saved["u"]["seen"] == 14 and fake.saved["u"]["steps"] == 0
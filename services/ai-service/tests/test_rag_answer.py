@@ -0,0 +1,49 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import rag
+from app.services.rag_engine import rag_engine
+
+@pytest.fixture
+def client(monkeypatch):
+    app = FastAPI()
+    app.include_router(rag.router, prefix="/api/v1")
+
+    async def rank(query, chunks):
+        return chunks
+
+    monkeypatch.setattr(rag_engine, "_rank_chunks", rank)
+    return TestClient(app)
+
+def reply(monkeypatch, answer, topics, questions):
+    async def generate(prompt, **kwargs):
+        return answer
+
+    async def generate_json(prompt, **kwargs):
+        return topics if "key topics" in prompt else questions
+
+    monkeypatch.setattr(rag_engine.gemini, "generate", generate)
+    monkeypatch.setattr(rag_engine.gemini, "generate_json", generate_json)
+
+def test_answer_keeps_only_string_items_of_malformed_lists(client, monkeypatch):
+    reply(monkeypatch, "Cells divide.", [{"name": "Mitosis"}, 3, "  ", "Meiosis"], [None, ["nested"], "Why?"])
+
+    response = client.post("/api/v1/rag/answer", json={"query": "How?", "context_chunks": ["Cells divide."]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["related_topics"] == ["Meiosis"]
+    assert body["suggested_questions"] == ["Why?"]
+
+def test_answer_falls_back_to_empty_lists_for_non_list_replies(client, monkeypatch):
+    reply(monkeypatch, "Cells divide.", {"topics": ["Mitosis"]}, "Why?")
+
+    response = client.post(
+        "/api/v1/rag/answer",
+        json={"query": "How?", "context_chunks": ["Cells divide."], "include_follow_up": True}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["related_topics"] == []
+    assert response.json()["suggested_questions"] == []